@@ -1,13 +1,15 @@
 """The new_light super class."""
-# from __future__ import annotations
+from __future__ import annotations
 
-# from homeassistant.core import HomeAssistant
-# from homeassistant.helpers.typing import ConfigType
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.discovery import async_load_platform
+from homeassistant.helpers.typing import ConfigType
 
-# DOMAIN = "xanders_room_light"
+from .const import DOMAIN
 
-# async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
-#    """Your controller/hub specific code."""
-#    hass.helpers.discovery.load_platform("light", DOMAIN, {}, config)
-#
-#    return True
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Load the metrics sensor platform, for the new_light light platform and every integration depending on it"""
+    hass.async_create_task(async_load_platform(hass, "sensor", DOMAIN, {}, config))
+
+    return True
@@ -0,0 +1,207 @@
+"""Shared loader for the optional JSON button map files"""
+from __future__ import annotations
+
+from datetime import timedelta
+import json
+import logging
+import os
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import event
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+CHECK_INTERVAL = timedelta(seconds=30)
+"""How often each button map file is checked for changes"""
+
+
+class ServiceAction:
+    """Button map action that makes a prepared service call"""
+
+    __slots__ = ("domain", "service", "data")
+
+    def __init__(self, domain, service, data) -> None:
+        self.domain = domain
+        self.service = service
+        self.data = data
+
+    async def run(self, light) -> None:
+        await light._hass_view.services.async_call(self.domain, self.service, self.data)
+
+    def __repr__(self) -> str:
+        return f"ServiceAction({self.domain}.{self.service}, {self.data})"
+
+
+class RightLightAction:
+    """Button map action that calls a method on one of the light's RightLight objects"""
+
+    __slots__ = ("entity", "method", "args", "kwargs")
+
+    def __init__(self, entity, method, *args, **kwargs) -> None:
+        self.entity = entity
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+
+    async def run(self, light) -> None:
+        rl = light.getRightLight(self.entity)
+        await getattr(rl, self.method)(*self.args, **self.kwargs)
+
+    def __repr__(self) -> str:
+        return f"RightLightAction({self.entity}.{self.method}, {self.args}, {self.kwargs})"
+
+
+def _is_number(val) -> bool:
+    return isinstance(val, (int, float)) and not isinstance(val, bool)
+
+
+def _compile_command(command):
+    """Turn one button map command list into an action, raising ValueError if it's malformed"""
+    if not isinstance(command, list) or len(command) < 2:
+        raise ValueError(f"command must be a list of at least two items: {command}")
+
+    ctype = command[0]
+    if ctype == "Scene":
+        if len(command) != 2 or not isinstance(command[1], str):
+            raise ValueError(f"expected ['Scene', scene]: {command}")
+        return ServiceAction("scene", "turn_on", {"entity_id": command[1]})
+
+    ent = command[1]
+    if not isinstance(ent, str):
+        raise ValueError(f"entity must be a string: {command}")
+
+    if ctype == "Brightness":
+        if len(command) != 3 or not _is_number(command[2]) or command[2] < 0:
+            raise ValueError(f"expected ['Brightness', entity, brightness]: {command}")
+        br = command[2]
+        if br == 0:
+            return ServiceAction("light", "turn_off", {"entity_id": ent})
+        return ServiceAction("light", "turn_on", {"entity_id": ent, "brightness": br})
+
+    if ctype == "RightLight":
+        if len(command) != 3:
+            raise ValueError(f"expected ['RightLight', entity, value]: {command}")
+        val = command[2]
+        if val == "Disable":
+            return RightLightAction(ent, "disable")
+        if (val == 0) or (val == "Off"):
+            return RightLightAction(ent, "disable_and_turn_off")
+        if _is_number(val):
+            return RightLightAction(ent, "turn_on", brightness=val, brightness_override=0)
+        if isinstance(val, str):
+            # Color mode names are checked against RightLight once the map reaches a light
+            return RightLightAction(ent, "turn_on", mode=val)
+        raise ValueError(f"unrecognized RightLight value: {command}")
+
+    if ctype == "Color":
+        if len(command) != 5 or not all(_is_number(c) for c in command[2:]):
+            raise ValueError(f"expected ['Color', entity, r, g, b]: {command}")
+        r, g, b = command[2:]
+        return RightLightAction(
+            ent,
+            "turn_on_specific",
+            {"entity_id": ent, "rgb_color": [r, g, b], "brightness": (r + g + b) / 3},
+        )
+
+    raise ValueError(f"unrecognized button_map.json command type: {ctype}")
+
+
+def compile_button_map(data) -> dict:
+    """Validate a loaded button map and compile it into a dispatch table
+
+    The result maps each button payload to a tuple of steps, one per successive press, where each step is a
+    tuple of actions ready to run.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("button map must be a JSON object")
+
+    table = {}
+    for payload, steps in data.items():
+        if not isinstance(steps, list) or len(steps) == 0:
+            raise ValueError(f"'{payload}' must be a non-empty list of command lists")
+        compiled = []
+        for step in steps:
+            if not isinstance(step, list):
+                raise ValueError(f"'{payload}' step must be a list of commands: {step}")
+            compiled.append(tuple(_compile_command(command) for command in step))
+        table[payload] = tuple(compiled)
+
+    return table
+
+
+class ButtonMapLoader:
+    """Watch one button_map.json and hand its compiled contents to every subscribed light
+
+    A single timer per file stats it in the executor and re-parses and compiles it, also in the executor, only
+    when the modification time changes.  Lights get the new table pushed to them and do no file work of their
+    own.  A map that fails to load or validate is logged and the previous one stays in use.
+    """
+
+    def __init__(self, hass: HomeAssistant, path: str) -> None:
+        self._hass = hass
+        self._path = path
+        self._mtime = None
+        self._data = {}
+        self._subscribers = []
+        self._unsub_timer = None
+
+    @property
+    def data(self) -> dict:
+        """Most recently compiled button map, shared read-only between lights"""
+        return self._data
+
+    async def async_subscribe(self, action):
+        """Call action(data) now and whenever the file changes.  Returns an unsubscribe function"""
+        self._subscribers.append(action)
+        if self._unsub_timer is None:
+            self._unsub_timer = event.async_track_time_interval(
+                self._hass, self._async_check, CHECK_INTERVAL
+            )
+            await self._async_check()
+        action(self._data)
+
+        @callback
+        def unsubscribe() -> None:
+            self._subscribers.remove(action)
+            if not self._subscribers and self._unsub_timer is not None:
+                self._unsub_timer()
+                self._unsub_timer = None
+
+        return unsubscribe
+
+    async def _async_check(self, now=None) -> None:
+        mtime = await self._hass.async_add_executor_job(self._getmtime)
+        if mtime is None or mtime == self._mtime:
+            return
+        self._mtime = mtime
+
+        try:
+            data = await self._hass.async_add_executor_job(self._load)
+        except (OSError, ValueError) as err:
+            _LOGGER.error("Unable to load button map %s: %s", self._path, err)
+            return
+
+        _LOGGER.debug("Loaded button map %s", self._path)
+        self._data = data
+        for action in list(self._subscribers):
+            action(data)
+
+    def _getmtime(self):
+        try:
+            return os.path.getmtime(self._path)
+        except OSError:
+            return None
+
+    def _load(self):
+        with open(self._path) as fp:
+            return compile_button_map(json.load(fp))
+
+
+def get_button_map_loader(hass: HomeAssistant, path: str) -> ButtonMapLoader:
+    """Return the ButtonMapLoader shared by every light using the file at path"""
+    loaders = hass.data.setdefault(DOMAIN, {}).setdefault("button_maps", {})
+    if path not in loaders:
+        loaders[path] = ButtonMapLoader(hass, path)
+    return loaders[path]
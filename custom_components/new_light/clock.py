@@ -0,0 +1,49 @@
+"""Wall clock used by NewLight, replaceable so replays can run on virtual time
+
+Intervals (latencies, pacing, cache ages) are measured on hass.loop.time(), so they follow whatever clock the
+event loop runs on.  Only wall clock readings go through here.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+import time
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt
+
+from .const import DOMAIN
+
+
+class Clock:
+    """The real wall clock"""
+
+    def now(self) -> datetime:
+        """Current time as an aware datetime"""
+        return dt.now()
+
+    def time(self) -> float:
+        """Current time as a Unix timestamp"""
+        return time.time()
+
+
+class VirtualClock(Clock):
+    """Wall clock that starts at a chosen datetime and advances with an event loop's time"""
+
+    def __init__(self, loop, start: datetime) -> None:
+        self._loop = loop
+        self._start = start
+        self._origin = loop.time()
+
+    def now(self) -> datetime:
+        return self._start + timedelta(seconds=self._loop.time() - self._origin)
+
+    def time(self) -> float:
+        return self.now().timestamp()
+
+
+def get_clock(hass: HomeAssistant) -> Clock:
+    """Return the Clock shared by every NewLight"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "clock" not in data:
+        data["clock"] = Clock()
+    return data["clock"]
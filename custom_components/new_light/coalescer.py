@@ -0,0 +1,129 @@
+"""Coalesce identical service calls made by many lights in the same event loop tick"""
+from __future__ import annotations
+
+import asyncio
+
+from homeassistant.const import ATTR_ENTITY_ID
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+
+def _freeze(value):
+    """Return a hashable version of a service data value"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _chain(task, fut) -> None:
+    """Pass a finished service call task's outcome on to its waiters"""
+    if fut.done():
+        return
+    if task.cancelled():
+        fut.cancel()
+    elif task.exception() is not None:
+        fut.set_exception(task.exception())
+    else:
+        fut.set_result(None)
+
+
+class ServiceCallCoalescer:
+    """Merge service calls with identical payloads into one call with a list entity_id
+
+    Calls are collected until the event loop gets round to the flush scheduled by the first of them, so
+    everything issued in the same tick (a scene, a tracker cascade, a midnight RightLight tick) goes out
+    as one call per distinct payload.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._pending = {}
+        """(domain, service, frozen data) => (data, entity ids, future)"""
+
+        self.requested = 0
+        """Number of service calls asked for"""
+        self.sent = 0
+        """Number of service calls actually made"""
+
+    @property
+    def merge_ratio(self) -> float:
+        """Requested calls per call sent"""
+        return self.requested / self.sent if self.sent else 1.0
+
+    async def async_call(self, domain, service, service_data=None, **kwargs) -> None:
+        """Drop-in replacement for hass.services.async_call"""
+        self.requested += 1
+
+        # Only plain calls targeting entities can be merged
+        if kwargs or not service_data or ATTR_ENTITY_ID not in service_data:
+            self.sent += 1
+            return await self._hass.services.async_call(
+                domain, service, service_data, **kwargs
+            )
+
+        data = dict(service_data)
+        ents = data.pop(ATTR_ENTITY_ID)
+        if isinstance(ents, str):
+            ents = [ents]
+
+        key = (domain, service, _freeze(data))
+        try:
+            hash(key)
+        except TypeError:
+            self.sent += 1
+            return await self._hass.services.async_call(domain, service, service_data)
+
+        batch = self._pending.get(key)
+        if batch is None:
+            if not self._pending:
+                self._hass.loop.call_soon(self._flush)
+            batch = self._pending[key] = (data, [], self._hass.loop.create_future())
+        batch[1].extend(e for e in ents if e not in batch[1])
+
+        # Shield so one cancelled caller doesn't cancel the call for everyone else in the batch
+        await asyncio.shield(batch[2])
+
+    def _flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        for (domain, service, _), (data, ents, fut) in pending.items():
+            self.sent += 1
+            data[ATTR_ENTITY_ID] = ents[0] if len(ents) == 1 else ents
+            task = self._hass.async_create_task(
+                self._hass.services.async_call(domain, service, data)
+            )
+            task.add_done_callback(lambda t, fut=fut: _chain(t, fut))
+
+
+class _ServicesView:
+    def __init__(self, services, async_call) -> None:
+        self._services = services
+        self.async_call = async_call
+
+    def __getattr__(self, name):
+        return getattr(self._services, name)
+
+
+class HassView:
+    """Stand-in for hass whose services.async_call goes through the given function
+
+    Everything else is passed through to the real hass object.  Handing this to RightLight routes its
+    light commands through the shared outbound layer without RightLight knowing about it.
+    """
+
+    def __init__(self, hass: HomeAssistant, async_call) -> None:
+        self._hass = hass
+        self.services = _ServicesView(hass.services, async_call)
+
+    def __getattr__(self, name):
+        return getattr(self._hass, name)
+
+
+def get_coalescer(hass: HomeAssistant) -> ServiceCallCoalescer:
+    """Return the ServiceCallCoalescer shared by every NewLight"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "coalescer" not in data:
+        data["coalescer"] = ServiceCallCoalescer(hass)
+    return data["coalescer"]
@@ -0,0 +1,147 @@
+"""Last commanded state of each light, used to skip commands that would change nothing"""
+from __future__ import annotations
+
+from homeassistant.const import ATTR_ENTITY_ID
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+TOLERANCES = {
+    "brightness": 1,
+    "kelvin": 10,
+    "color_temp": 1,
+    "rgb_color": 1,
+    "hs_color": 0.5,
+    "xy_color": 0.001,
+}
+"""Largest difference in each attribute that still counts as the same target"""
+
+MAX_AGE = 600
+"""Seconds after a command's transition ends that its state is no longer trusted and commands go out regardless.
+Counted from the end so hour-long Normal mode transitions are still trusted when the next keyframe repeats them"""
+
+TRANSITION_SLACK = 3
+"""Seconds before a transition ends that the light counts as having arrived.  RightLight starts each long
+transition a second or two after its trip point, so it ends just after the next keyframe is due"""
+
+
+def _close(key, old, new) -> bool:
+    tol = TOLERANCES.get(key, 0)
+    if isinstance(new, (list, tuple)):
+        return (
+            isinstance(old, (list, tuple))
+            and len(old) == len(new)
+            and all(abs(o - n) <= tol for o, n in zip(old, new))
+        )
+    if isinstance(new, (int, float)) and isinstance(old, (int, float)):
+        return abs(old - new) <= tol
+    return old == new
+
+
+class CommandCache:
+    """Remember the target of the last light.turn_on/turn_off sent to each entity
+
+    A command is redundant if it asks for the same on/off state and attributes (within TOLERANCES) as the last
+    one, that command's transition has finished, and Home Assistant still shows the entity on or off as
+    commanded.  Anything else, including calls with extra keyword arguments or several entities at once, is
+    passed through and only forgets the affected entity.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._last = {}
+        """entity_id => (service, target attributes, time sent, transition end, seeded from state)"""
+
+        self.lookups = 0
+        """Number of commands checked against the cache"""
+        self.hits = 0
+        """Number of commands skipped as redundant"""
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of checked commands that were skipped"""
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def invalidate(self, entity_id=None) -> None:
+        """Forget one entity's last command, or every entity's, so the next command is sent"""
+        if entity_id is None:
+            self._last.clear()
+        else:
+            self._last.pop(entity_id, None)
+
+    def seed(self, entity_id, state) -> None:
+        """Take an entity's current Home Assistant state as if it had been commanded, e.g. after a restart
+
+        A command then only needs to match the attributes it sets, since a state reports more than any one
+        command sends.
+        """
+        if state is None or state.state not in ("on", "off"):
+            return
+        now = self._hass.loop.time()
+        if state.state == "off":
+            self._last[entity_id] = ("turn_off", {}, now, now, True)
+            return
+
+        target = {}
+        attrs = state.attributes
+        if attrs.get("brightness") is not None:
+            target["brightness"] = attrs["brightness"]
+        if attrs.get("color_temp_kelvin") is not None:
+            target["kelvin"] = attrs["color_temp_kelvin"]
+        elif attrs.get("color_temp"):
+            target["kelvin"] = 1000000 / attrs["color_temp"]
+        for key in ("rgb_color", "hs_color", "xy_color"):
+            if attrs.get(key) is not None:
+                target[key] = attrs[key]
+        self._last[entity_id] = ("turn_on", target, now, now, True)
+
+    def forget(self, service_data) -> None:
+        """Invalidate every entity a command was addressed to, e.g. because it failed"""
+        ent = (service_data or {}).get(ATTR_ENTITY_ID)
+        if isinstance(ent, str):
+            self._last.pop(ent, None)
+        elif isinstance(ent, (list, tuple)):
+            for e in ent:
+                self._last.pop(e, None)
+
+    def check(self, domain, service, service_data, force=False) -> bool:
+        """Record a command about to be sent.  Returns True if it would not change the light and can be skipped"""
+        ent = (service_data or {}).get(ATTR_ENTITY_ID)
+        if domain != "light" or service not in ("turn_on", "turn_off") or not isinstance(ent, str):
+            self.forget(service_data)
+            return False
+
+        target = {k: v for k, v in service_data.items() if k not in (ATTR_ENTITY_ID, "transition")}
+        now = self._hass.loop.time()
+
+        self.lookups += 1
+        last = self._last.get(ent)
+        if not force and last is not None and self._same(ent, last, service, target, now):
+            self.hits += 1
+            return True
+
+        self._last[ent] = (service, target, now, now + service_data.get("transition", 0), False)
+        return False
+
+    def _same(self, ent, last, service, target, now) -> bool:
+        l_service, l_target, sent, transition_end, seeded = last
+        if l_service != service or not transition_end - TRANSITION_SLACK <= now <= transition_end + MAX_AGE:
+            return False
+        if not (target.keys() <= l_target.keys() if seeded else target.keys() == l_target.keys()):
+            return False
+        if not all(_close(k, l_target[k], v) for k, v in target.items()):
+            return False
+
+        # Catch lights switched outside of NewLight
+        state = self._hass.states.get(ent)
+        if state is not None and state.state != ("on" if service == "turn_on" else "off"):
+            return False
+        return True
+
+
+def get_command_cache(hass: HomeAssistant) -> CommandCache:
+    """Return the CommandCache shared by every NewLight"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "command_cache" not in data:
+        data["command_cache"] = CommandCache(hass)
+    return data["command_cache"]
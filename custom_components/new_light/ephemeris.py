@@ -0,0 +1,61 @@
+"""Cached sunrise/sunset times shared by every RightLight"""
+from datetime import timedelta
+
+from suntime import Sun
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt
+
+
+class SolarEphemeris:
+    """Sunrise and sunset for one location, computed once per date"""
+
+    def __init__(self, latitude, longitude) -> None:
+        self._sun = Sun(latitude, longitude)
+        self._days = {}
+        self._warming = False
+
+    def get(self, day):
+        """Return local (sunrise, sunset) datetimes for the given date"""
+        times = self._days.get(day)
+        if times is None:
+            # Cache miss, normally avoided by async_precompute at startup
+            times = self._days[day] = self._compute(day)
+        return times
+
+    def precompute(self, start, days=365) -> None:
+        """Fill the cache for 'days' dates from 'start'.  Blocking, run in an executor"""
+        computed = {}
+        for i in range(days):
+            day = start + timedelta(days=i)
+            if day not in self._days:
+                computed[day] = self._compute(day)
+        self._days.update(computed)
+
+    async def async_precompute(self, hass: HomeAssistant, days=365) -> None:
+        """Precompute a year of sun times without blocking the event loop"""
+        await hass.async_add_executor_job(self.precompute, dt.now().date(), days)
+
+    def warm(self, hass: HomeAssistant) -> None:
+        """Start async_precompute in the background, once per process"""
+        if not self._warming:
+            self._warming = True
+            hass.async_create_task(self.async_precompute(hass))
+
+    def _compute(self, day):
+        # suntime works in UTC, so pin the local result back onto the requested date
+        sunrise = dt.as_local( self._sun.get_sunrise_time(day) )
+        sunset  = dt.as_local( self._sun.get_sunset_time(day)  )
+        sunrise = sunrise.replace(year=day.year, month=day.month, day=day.day)
+        sunset  = sunset.replace(year=day.year, month=day.month, day=day.day)
+        return sunrise, sunset
+
+
+_ephemerides = {}
+
+
+def get_ephemeris(latitude, longitude) -> SolarEphemeris:
+    """Return the process-wide SolarEphemeris for a location"""
+    eph = _ephemerides.get((latitude, longitude))
+    if eph is None:
+        eph = _ephemerides[(latitude, longitude)] = SolarEphemeris(latitude, longitude)
+    return eph
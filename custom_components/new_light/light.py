@@ -0,0 +1,41 @@
+"""Light platform creating NewLight rooms from YAML
+
+light:
+  - platform: new_light
+    rooms:
+      - name: Kitchen
+        entities: [light.kitchen_main, light.kitchen_extra]
+        switch: Kitchen Switch
+        motion_sensors: [Kitchen Motion Sensor]
+        has_brightness_threshold: true
+
+The integration's async_setup loads the sensor platform, which adds a diagnostic metrics sensor per room.
+"""
+from __future__ import annotations
+
+import voluptuous as vol
+
+from homeassistant.components.light import PLATFORM_SCHEMA
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
+
+from .loader import CONF_ROOMS, ROOM_SCHEMA, StartupTimer, build_light
+
+PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
+    {vol.Required(CONF_ROOMS): vol.All([ROOM_SCHEMA], vol.Length(min=1))}
+)
+
+
+async def async_setup_platform(
+    hass: HomeAssistant,
+    config: ConfigType,
+    add_entities: AddEntitiesCallback,
+    discovery_info: DiscoveryInfoType | None = None,
+) -> None:
+    """Set up every configured room"""
+    lights = [build_light(room) for room in config[CONF_ROOMS]]
+    StartupTimer(lights)
+
+    # Added as one batch so Home Assistant sets them up concurrently
+    add_entities(lights)
@@ -0,0 +1,138 @@
+"""Build NewLight rooms from configuration instead of per-room subclasses"""
+from __future__ import annotations
+
+from collections import OrderedDict
+import logging
+import time
+
+import voluptuous as vol
+
+from homeassistant.const import CONF_NAME
+import homeassistant.helpers.config_validation as cv
+
+from .const import DOMAIN
+from .new_light import NewLight
+from .optimizer import ScheduleOptimizer, max_device_transition
+
+_LOGGER = logging.getLogger(__name__)
+
+CONF_ROOMS = "rooms"
+CONF_ENTITIES = "entities"
+CONF_DOMAIN = "domain"
+CONF_BUTTON_MAP = "button_map"
+CONF_DEBUG = "debug"
+CONF_DEBUG_RL = "debug_rl"
+
+_brightness = vol.All(vol.Coerce(int), vol.Range(min=0, max=255))
+_transition = vol.All(vol.Coerce(float), vol.Range(min=0))
+_tolerance = vol.All(vol.Coerce(float), vol.Range(min=0))
+
+OPTIMIZER_SCHEMA = vol.All(
+    {
+        vol.Optional("rgb_tolerance", default=0): _tolerance,
+        vol.Optional("kelvin_tolerance", default=0): _tolerance,
+        vol.Optional("brightness_tolerance", default=0): _tolerance,
+        vol.Optional("max_transition", default=max_device_transition): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=max_device_transition)
+        ),
+    },
+    lambda conf: ScheduleOptimizer(**conf),
+)
+"""Trip point thinning for a room's RightLights, see ScheduleOptimizer.  Off unless configured"""
+
+ROOM_ATTRIBUTES = {
+    "entities_below_threshold": vol.All(cv.ensure_list, [cv.entity_id]),
+    "entities_above_threshold": vol.All(cv.ensure_list, [cv.entity_id]),
+    "brightness_multiplier": {cv.entity_id: vol.Coerce(float)},
+    "switch": cv.string,
+    "motion_sensors": vol.All(cv.ensure_list, [cv.string]),
+    "has_brightness_threshold": cv.boolean,
+    "brightness_threshold": _brightness,
+    "motion_disable_entities": vol.All(cv.ensure_list, [cv.entity_id]),
+    "brightness_step": _brightness,
+    "motion_sensor_brightness": _brightness,
+    "switch_transition": _transition,
+    "motion_sensor_transition": _transition,
+    "default_transition": _transition,
+    "other_light_trackers": {cv.entity_id: vol.All(vol.Coerce(int), vol.Range(min=-1, max=255))},
+    "track_other_light_off_events": cv.boolean,
+    "turn_off_other_lights": cv.boolean,
+    "push_state_updates": cv.boolean,
+    "concurrent_dispatch": cv.boolean,
+    "max_concurrent_commands": vol.All(vol.Coerce(int), vol.Range(min=1)),
+    "suppress_redundant_commands": cv.boolean,
+    "schedule_optimizer": OPTIMIZER_SCHEMA,
+}
+"""Optional room settings, each copied onto the NewLight attribute of the same name"""
+
+ROOM_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_NAME): cv.string,
+        vol.Required(CONF_ENTITIES): vol.All(cv.ensure_list, [cv.entity_id], vol.Length(min=1)),
+        vol.Optional(CONF_DOMAIN, default=DOMAIN): cv.string,
+        vol.Optional(CONF_BUTTON_MAP): cv.string,
+        vol.Optional(CONF_DEBUG, default=False): cv.boolean,
+        vol.Optional(CONF_DEBUG_RL, default=False): cv.boolean,
+        **{vol.Optional(key): validator for key, validator in ROOM_ATTRIBUTES.items()},
+    }
+)
+"""One room: the light entities it drives (primary first) plus any NewLight settings"""
+
+
+def build_light(room) -> NewLight:
+    """Create a NewLight from one validated room configuration"""
+    light = NewLight(
+        room[CONF_NAME],
+        domain=room[CONF_DOMAIN],
+        debug=room[CONF_DEBUG],
+        debug_rl=room[CONF_DEBUG_RL],
+    )
+    light.entities = OrderedDict((ent, None) for ent in room[CONF_ENTITIES])
+    for key in ROOM_ATTRIBUTES:
+        if key in room:
+            setattr(light, key, room[key])
+    if CONF_BUTTON_MAP in room:
+        light._button_map_file = room[CONF_BUTTON_MAP]
+    return light
+
+
+class StartupTimer:
+    """Time how long a batch of configured lights takes to finish async_added_to_hass"""
+
+    def __init__(self, lights) -> None:
+        self._expected = len(lights)
+        self._start = time.monotonic()
+        self._ready = []
+        self._failed = 0
+        self._phases = {}
+        """Phase name => longest time any light spent in it"""
+        for light in lights:
+            light._startup_timer = self
+
+        self.total = None
+        """Seconds from building the lights to the last one being set up"""
+
+    def light_ready(self, light, ok=True) -> None:
+        """Called by each light at the end of its async_added_to_hass, ok is False if it raised"""
+        light._startup_timer = None
+        if not ok:
+            self._failed += 1
+        self._ready.append(light._setup_duration)
+        for name, secs in light._setup_phases.items():
+            self._phases[name] = max(secs, self._phases.get(name, 0))
+        if len(self._ready) < self._expected:
+            return
+
+        self.total = time.monotonic() - self._start
+        _LOGGER.info(
+            "new_light: %d lights set up in %.0f ms, %d failed (longest light %.0f ms, sum of lights %.0f ms)",
+            self._expected,
+            self.total * 1000,
+            self._failed,
+            max(self._ready) * 1000,
+            sum(self._ready) * 1000,
+        )
+        _LOGGER.info(
+            "new_light: slowest light per phase: %s",
+            ", ".join(f"{name} {secs * 1000:.0f} ms" for name, secs in self._phases.items()),
+        )
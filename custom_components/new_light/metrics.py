@@ -0,0 +1,144 @@
+"""Per-light latency histograms and command counters"""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+
+from homeassistant.core import HomeAssistant
+
+from .clock import get_clock
+from .const import DOMAIN
+from .trace import Trace
+
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+"""Upper bounds of the histogram buckets in milliseconds, plus one overflow bucket"""
+
+SOURCES = ("switch", "motion", "tracker", "scheduled", "button_map")
+"""Where a light's commands can come from"""
+
+
+class Histogram:
+    """Fixed-bucket latency histogram.  Recording is a bisect and two additions"""
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self) -> None:
+        self.counts = array("L", bytes(array("L").itemsize * (len(BUCKETS_MS) + 1)))
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, secs) -> None:
+        """Record one duration in seconds"""
+        self.counts[bisect_left(BUCKETS_MS, secs * 1000)] += 1
+        self.count += 1
+        self.total += secs
+
+    def quantile(self, q):
+        """Upper bound in ms of the bucket holding quantile q, None if empty or in the overflow bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 1) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+        }
+
+
+class LightMetrics:
+    """Everything recorded for one light"""
+
+    __slots__ = ("name", "event_latency", "service_call", "tick_lag", "commands", "trace")
+
+    def __init__(self, name, clock) -> None:
+        self.name = name
+        self.event_latency = Histogram()
+        """Switch, motion or tracker event to the first command it causes"""
+        self.service_call = Histogram()
+        """Time for one service call to go through the outbound scheduler and complete"""
+        self.tick_lag = Histogram()
+        """Time scheduled RightLight commands wait for the command budget"""
+        self.commands = dict.fromkeys(SOURCES, 0)
+        """Commands sent per source"""
+        self.trace = Trace(name, clock=clock)
+        """Recent events, decisions and commands"""
+
+    def snapshot(self) -> dict:
+        return {
+            "event_latency": self.event_latency.snapshot(),
+            "service_call": self.service_call.snapshot(),
+            "tick_lag": self.tick_lag.snapshot(),
+            "commands": dict(self.commands),
+        }
+
+
+class MetricsRegistry:
+    """All lights' metrics, plus the hook the sensor platform uses to add a sensor per light"""
+
+    def __init__(self, clock) -> None:
+        self._clock = clock
+        """Unix time source for trace records"""
+        self.lights = {}
+        """light name => LightMetrics"""
+        self._listener = None
+
+    def register(self, name) -> LightMetrics:
+        """Return the metrics for a light, creating them (and its sensor, if sensors are loaded) if needed"""
+        metrics = self.lights.get(name)
+        if metrics is None:
+            metrics = self.lights[name] = LightMetrics(name, self._clock)
+            if self._listener is not None:
+                self._listener([metrics])
+        return metrics
+
+    def set_listener(self, listener) -> None:
+        """Call listener(list of LightMetrics) for every light registered now and later"""
+        self._listener = listener
+        if self.lights:
+            listener(list(self.lights.values()))
+
+    def export_text(self) -> str:
+        """Render everything in the Prometheus text exposition format"""
+        lines = []
+        for metric in ("event_latency", "service_call", "tick_lag"):
+            lines.append(f"# TYPE new_light_{metric}_seconds histogram")
+            for name, metrics in self.lights.items():
+                hist = getattr(metrics, metric)
+                seen = 0
+                for bound, n in zip(BUCKETS_MS, hist.counts):
+                    seen += n
+                    lines.append(
+                        f'new_light_{metric}_seconds_bucket{{light="{name}",le="{bound / 1000}"}} {seen}'
+                    )
+                lines.append(f'new_light_{metric}_seconds_bucket{{light="{name}",le="+Inf"}} {hist.count}')
+                lines.append(f'new_light_{metric}_seconds_sum{{light="{name}"}} {hist.total}')
+                lines.append(f'new_light_{metric}_seconds_count{{light="{name}"}} {hist.count}')
+
+        lines.append("# TYPE new_light_commands_total counter")
+        for name, metrics in self.lights.items():
+            for source, n in metrics.commands.items():
+                lines.append(f'new_light_commands_total{{light="{name}",source="{source}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def dump_trace(self, name=None) -> str:
+        """Render the trace of one light, or every light merged in time order"""
+        traces = [self.lights[name].trace] if name is not None else [m.trace for m in self.lights.values()]
+        entries = sorted(entry for trace in traces for entry in trace.entries())
+        return "".join(f"{line}\n" for ts, line in entries)
+
+
+def get_metrics(hass: HomeAssistant) -> MetricsRegistry:
+    """Return the MetricsRegistry shared by every NewLight"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "metrics" not in data:
+        data["metrics"] = MetricsRegistry(get_clock(hass).time)
+    return data["metrics"]
@@ -2,21 +2,21 @@
 from __future__ import annotations
 from collections import OrderedDict
 
-import json
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
 import logging, logging.handlers
-import sys, os
+import time
 
 from homeassistant.components.light import (  # ATTR_EFFECT,; ATTR_FLASH,; ATTR_WHITE_VALUE,; PLATFORM_SCHEMA,; SUPPORT_EFFECT,; SUPPORT_FLASH,; SUPPORT_WHITE_VALUE,; ATTR_SUPPORTED_COLOR_MODES,
     ATTR_BRIGHTNESS,
     ATTR_COLOR_MODE,
     ATTR_COLOR_TEMP,
     ATTR_EFFECT,
-    ATTR_EFFECT_LIST,
     ATTR_HS_COLOR,
     ATTR_MAX_MIREDS,
     ATTR_MIN_MIREDS,
     ATTR_RGB_COLOR,
-    ATTR_TRANSITION,
     ENTITY_ID_FORMAT,
     SUPPORT_BRIGHTNESS,
     SUPPORT_COLOR,
@@ -31,26 +31,68 @@ from homeassistant.const import (  # ATTR_SUPPORTED_FEATURES,; CONF_ENTITY_ID,;
 
 # from enum import Enum
 # import homeassistant.helpers.config_validation as cv
-from homeassistant.core import HomeAssistant, callback
+from homeassistant.core import callback
 from homeassistant.helpers import event
 from homeassistant.helpers.entity import generate_entity_id
-from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
-
-sys.path.append("custom_components/right_light")
-from right_light import RightLight
+from homeassistant.helpers.restore_state import RestoreEntity
+
+from .button_map import RightLightAction, get_button_map_loader
+from .clock import get_clock
+from .coalescer import HassView
+from .command_cache import get_command_cache
+from .metrics import get_metrics
+from .occupancy import get_occupancy_service
+from .outbound import (
+    MOTION,
+    PRIORITY_NAMES,
+    SCHEDULED,
+    SWITCH,
+    TRACKER,
+    get_outbound_scheduler,
+)
+from .right_light import RightLight
+from .router import get_mqtt_router, get_zha_router
 
 _LOGGER = logging.getLogger(__name__)
 
+
+class _Command:
+    """A switch press, motion or tracker event being acted on, and the light acting on it"""
+
+    __slots__ = ("light", "priority", "since", "source")
+
+    def __init__(self, light, priority, since) -> None:
+        self.light = light
+        self.priority = priority
+        self.since = since
+        """Event loop time of the event, until its first command goes out"""
+        self.source = None
+        """Command source to count outbound calls under when it isn't the priority class, i.e. button maps"""
+
+
+_command = ContextVar("new_light_command", default=None)
+"""The _Command the current task is working on.  Tasks started while it runs (parallel dispatch) share it, and
+RightLight timers run without one, so their steps go out as SCHEDULED"""
+
 # Uncomment the next lines to enable remote logging of events
 # _LOGGER.setLevel(logging.ERROR)
 # lh = logging.handlers.SysLogHandler(address=("192.168.1.7", 514))
 # _LOGGER.addHandler(lh)
 
 
-class NewLight(LightEntity):
+class NewLight(LightEntity, RestoreEntity):
     """New Light Super Class"""
 
+    _unrecorded_attributes = frozenset(
+        {
+            "command_latency_ms",
+            "setup_ms",
+            "motion_latency_ms",
+            "mailbox_depth",
+            "mailbox_dropped",
+        }
+    )
+
     def __init__(self, name, domain="UNKNOWN", debug=False, debug_rl=False) -> None:
         """Initialize NewLight Super Class."""
 
@@ -118,6 +160,24 @@ class NewLight(LightEntity):
         self.turn_off_other_lights = False
         """Immediately turn back off any tracked light when an on event is received (for template lights as buttons)"""
 
+        self.push_state_updates = True
+        """Mirror the primary entity's color state when it changes instead of polling it"""
+
+        self.concurrent_dispatch = True
+        """Send per-entity RightLight commands in parallel instead of one entity at a time"""
+
+        self.max_concurrent_commands = 4
+        """Maximum number of entities commanded at once when dispatching concurrently"""
+
+        self.suppress_redundant_commands = True
+        """Skip light commands that would not change what the entity was last told to do"""
+
+        self.force_resend = False
+        """Send every command even if redundant.  Switch presses are always sent"""
+
+        self.schedule_optimizer = None
+        """Optional ScheduleOptimizer thinning out every RightLight's trip points.  None follows every trip point"""
+
         self._name = name
         """Name of this object"""
 
@@ -145,8 +205,8 @@ class NewLight(LightEntity):
         """Boolean to show if light is on"""
         self._available = True
         """Boolean to show if light is available (always true)"""
-        self._occupancies = {}
-        """Array of booleans for tracking individual motion sensor states"""
+        self._occupancy_group = None
+        """This light's motion sensors in the shared occupancy service"""
         self._occupancy = False
         """Single attribute for tracking overall occupancy state"""
         self._entity_id = generate_entity_id(ENTITY_ID_FORMAT, self.name, [])
@@ -158,10 +218,16 @@ class NewLight(LightEntity):
         """Store the current effect being used"""
         self._button_map_file = f"custom_components/{domain}/button_map.json"
         """Name of the optional JSON button map file"""
-        self._button_map_timestamp = 0
-        """Store timestamp of previously loaded button map file"""
         self._button_map_data = {}
-        """Data loaded from optional JSON button map script"""
+        """Dispatch table compiled from the optional JSON button map script"""
+        self._button_map_unsub = None
+        """Unsubscribes from the shared button map loader"""
+        self._primary_unsub = None
+        """Unsubscribes from primary entity state changes in push mode"""
+        self._switch_unsub = None
+        """Unregisters the switch from the shared ZHA or MQTT router"""
+        self._occupancy_unsub = None
+        """Stops watching motion sensors in the shared occupancy service"""
         # self._effect: Optional[str] = None
         self._supported_features: int = 0
         """Supported features of this light.  OR togther SUPPORT_BRIGHTNESS, SUPPORT_COLOR_TEMP, SUPPORT_COLOR, SUPPORT_TRANSITION"""
@@ -172,25 +238,8 @@ class NewLight(LightEntity):
         self._supported_features |= SUPPORT_EFFECT
         # self._supported_features |= SUPPORT_WHITE_VALUE
 
-        self._buttonCounts = {
-            "on-press": 0,
-            "on-hold": 0,
-            "up-press": 0,
-            "up-hold": 0,
-            "down-press": 0,
-            "down-hold": 0,
-            "off-press": 0,
-            "off-hold": 0,
-            "on_press": 0,
-            "on_hold": 0,
-            "up_press": 0,
-            "up_hold": 0,
-            "down_press": 0,
-            "down_hold": 0,
-            "off_press": 0,
-            "off_hold": 0,
-        }
-        """Stores current button presses for handling JSON buttonmap lists"""
+        self._button_seq = (None, 0)
+        """(last held button, index of its next step) for stepping through JSON buttonmap lists"""
 
         self._switched_on = False
         """Boolean showing whether the light was turned on by a switch/GUI"""
@@ -207,80 +256,241 @@ class NewLight(LightEntity):
         self._others = {}
         """Dictionary of states of other lights being tracked"""
 
+        self._command_latency = None
+        """Seconds taken by the most recent turn on/off to command all entities"""
+
+        self._motion_plan = None
+        """Precomputed motion sensor turn on commands, see _build_motion_plan"""
+        self._motion_latency = None
+        """Seconds from the latest motion event to its first command being sent"""
+
+        self._outbound = None
+        """Shared outbound command budget and priority queues, set up once added to hass"""
+        self._command_cache = None
+        """Shared last commanded state of every entity, set up once added to hass"""
+        self._metrics = None
+        """This light's latency histograms and command counters, set up once added to hass"""
+        self._trace = None
+        """Ring buffer of this light's recent events, decisions and commands, set up once added to hass"""
+
+        self._mailbox_pending = None
+        """Newest switch command waiting to run, as (function, kwargs, event loop time posted)"""
+        self._mailbox_task = None
+        """Task working through the switch command mailbox"""
+        self._mailbox_command = None
+        """Task running the mailbox command in flight, if any"""
+        self._mailbox_posted = 0
+        """Number of commands posted to the mailbox"""
+        self._mailbox_dropped = 0
+        """Number of mailbox commands superseded before finishing"""
+
+        self._setup_duration = None
+        """Seconds async_added_to_hass took for this light"""
+        self._setup_phases = {}
+        """Seconds taken by each phase of async_added_to_hass"""
+
+        self._startup_timer = None
+        """StartupTimer to report to once set up, when created by the declarative loader"""
+
+        self._hass_view = None
+        """hass as seen by RightLight and button map commands, with service calls routed through the outbound scheduler"""
+
         if self._debug:
-            _LOGGER.info(f"{self.name} Light initialized")
+            _LOGGER.info("%s Light initialized", self.name)
 
     async def async_added_to_hass(self) -> None:
         """Initialize light objects"""
+        start = time.monotonic()
+        self._setup_phases = {}
+
+        ok = False
+        try:
+            # Dictionary to track other light states
+            for ent in self.other_light_trackers:
+                self._others[ent] = False
+
+            # Route all outbound service calls through the shared priority scheduler, which coalesces them
+            self._outbound = get_outbound_scheduler(self.hass)
+            self._command_cache = get_command_cache(self.hass)
+            self._metrics = get_metrics(self.hass).register(self.name)
+            self._trace = self._metrics.trace
+            self._hass_view = HassView(self.hass, self._outbound_call)
+
+            # Only the primary RightLight is needed up front, for its color modes.  The rest are created on first use
+            with self._setup_phase("rightlight"):
+                f, r = self.getEntityNames()
+                self._effect_list = ["Normal"] + self.getRightLight(f).getColorModes()
+
+            # Mirror the primary entity's color state as it changes
+            if self.push_state_updates:
+                self._primary_unsub = event.async_track_state_change_event(
+                    self.hass, f, self._primary_state_update
+                )
+                self._mirror_state(self.hass.states.get(f))
+
+            # Wait on the button map, switch and motion sensor subscriptions together
+            with self._setup_phase("subscriptions"):
+                await asyncio.gather(
+                    self._async_setup_button_map(),
+                    self._async_setup_switch(),
+                    self._async_setup_motion_sensors(),
+                )
 
-        # Start with all motion sensor states as off
-        for ms in self.motion_sensors:
-            self._occupancies[ms] = False
+            # if self.has_motion_sensor:
+            #    await self.hass.components.mqtt.async_subscribe(
+            #        self.motion_sensor_action, self.motion_sensor_message_received
+            #    )
 
-        # Dictionary to track other light states
-        for ent in self.other_light_trackers:
-            self._others[ent] = False
+            ## Subscribe to harmony events
+            # if self.harmony_entity != None:
+            #    event.async_track_state_change_event(
+            #        self.hass, self.harmony_entity, self.harmony_update
+            #    )
+
+            # Subscribe to motion_disable_entities events
+            for ent in self.motion_disable_entities:
+                event.async_track_state_change_event(
+                    self.hass, ent, self.motion_disable_entity_update
+                )
 
-        # Instantiate per-entity rightlight objects
-        for entname in self.entities.keys():
-            self.entities[entname] = RightLight(entname, self.hass, self._debug_rl)
+            # Subscribe to other entity events
+            for ent in self.other_light_trackers.keys():
+                event.async_track_state_change_event(
+                    self.hass, ent, self.other_entity_update
+                )
+
+            # Carry on from where the light was before a restart
+            with self._setup_phase("restore"):
+                await self._async_restore()
+            ok = True
+        finally:
+            # Report failed lights too, so the startup summary is still logged
+            self._setup_duration = time.monotonic() - start
+            if self._startup_timer is not None:
+                self._startup_timer.light_ready(self, ok)
+
+        if self._debug:
+            _LOGGER.debug(
+                "%s set up in %.1f ms: %s",
+                self.name,
+                self._setup_duration * 1000,
+                self.setup_phases_ms,
+            )
+        self.async_schedule_update_ha_state(force_refresh=True)
 
-            # Add RightLight color mode to effects list
-            self._effect_list = ["Normal"] + self.entities[entname].getColorModes()
+    @contextmanager
+    def _setup_phase(self, name):
+        """Record how long a block of async_added_to_hass takes under name"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._setup_phases[name] = time.monotonic() - start
 
-        # Subscribe to switch events
-        if self.switch != None:
+    @property
+    def setup_phases_ms(self) -> dict:
+        """Milliseconds taken by each phase of async_added_to_hass"""
+        return {
+            name: round(secs * 1000, 1) for name, secs in self._setup_phases.items()
+        }
+
+    async def _async_setup_button_map(self) -> None:
+        """Receive the JSON button map whenever the shared loader picks up a change"""
+        with self._setup_phase("button_map"):
+            self._button_map_unsub = await get_button_map_loader(
+                self.hass, self._button_map_file
+            ).async_subscribe(self._button_map_updated)
+
+    async def _async_setup_switch(self) -> None:
+        """Subscribe to switch events"""
+        if self.switch == None:
+            return
+
+        with self._setup_phase("switch"):
             if ":" in self.switch:
-                # ZHA type switch
-                self.hass.bus.async_listen("zha_event", self.switch_message_received)
+                # ZHA type switch, events routed here by device IEEE address
+                self._switch_unsub = get_zha_router(self.hass).register(
+                    self.switch, self.switch_message_received
+                )
             else:
                 # Zigbee2mqtt type switch
                 switch_action = f"zigbee2mqtt/{self.switch}/action"
-                await self.hass.components.mqtt.async_subscribe(
+                self._switch_unsub = await get_mqtt_router(self.hass).async_register(
                     switch_action, self.switch_message_received
                 )
 
-        # Subscribe to motion sensor events
-        for ms in self.motion_sensors:
-            if "binary_sensor" in ms:
-                event.async_track_state_change_event(
-                    self.hass, ms, self.motion_sensor_message_received_zha
-                )
-            else:
-                action = f"zigbee2mqtt/{ms}"
-                await self.hass.components.mqtt.async_subscribe(
-                    action, self.motion_sensor_message_received
-                )
+    async def _async_setup_motion_sensors(self) -> None:
+        """Follow the combined occupancy of this light's motion sensors"""
+        if not self.motion_sensors:
+            return
 
-        # if self.has_motion_sensor:
-        #    await self.hass.components.mqtt.async_subscribe(
-        #        self.motion_sensor_action, self.motion_sensor_message_received
-        #    )
-
-        ## Subscribe to harmony events
-        # if self.harmony_entity != None:
-        #    event.async_track_state_change_event(
-        #        self.hass, self.harmony_entity, self.harmony_update
-        #    )
-
-        # Subscribe to motion_disable_entities events
-        for ent in self.motion_disable_entities:
-            event.async_track_state_change_event(
-                self.hass, ent, self.motion_disable_entity_update
+        with self._setup_phase("motion_sensors"):
+            (
+                self._occupancy_group,
+                self._occupancy_unsub,
+            ) = await get_occupancy_service(self.hass).async_watch(
+                self.motion_sensors, self.motion_occupancy_changed
             )
+            self._occupancy = self._occupancy_group.occupied
 
-        # Subscribe to other entity events
-        for ent in self.other_light_trackers.keys():
-            event.async_track_state_change_event(
-                self.hass, ent, self.other_entity_update
-            )
+            # Keep the motion turn on commands ready to fire
+            self._motion_plan = self._build_motion_plan()
 
-        self.async_schedule_update_ha_state(force_refresh=True)
+    async def _async_restore(self) -> None:
+        """Restore brightness, override, effect, switch state and RightLight mode saved before a restart.
+
+        The entities' current states are taken as already commanded, so re-arming RightLight only sends what
+        differs from what the lights are showing, plus the transitions that keep the schedule going.
+        """
+        last = await self.async_get_last_state()
+        if last is None:
+            return
+
+        attrs = last.attributes
+        self._brightness_override = attrs.get("brightness_override", 0)
+        if last.state != "on":
+            return
+
+        self._brightness = attrs.get(ATTR_BRIGHTNESS) or 255
+        switched_on = attrs.get("switched_on", False)
+        mode = attrs.get("mode", "On")
+        effect = attrs.get(ATTR_EFFECT, "Normal")
+
+        for ent in self.entities:
+            self._command_cache.seed(ent, self.hass.states.get(ent))
+
+        if self._debug:
+            _LOGGER.debug(
+                "%s restoring %s/%s at %s", self.name, mode, effect, self._brightness
+            )
+        with self._prioritized(SCHEDULED):
+            if mode not in ("On", "Off"):
+                await self._async_turn_on_mode(mode=mode)
+            elif effect in (self._effect_list or []):
+                await self._async_turn_on(brightness=self._brightness, effect=effect)
+            else:
+                await self._async_turn_on(brightness=self._brightness)
+        self._switched_on = switched_on
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Release shared resources"""
+        if self._button_map_unsub is not None:
+            self._button_map_unsub()
+            self._button_map_unsub = None
+        if self._primary_unsub is not None:
+            self._primary_unsub()
+            self._primary_unsub = None
+        if self._switch_unsub is not None:
+            self._switch_unsub()
+            self._switch_unsub = None
+        if self._occupancy_unsub is not None:
+            self._occupancy_unsub()
+            self._occupancy_unsub = None
 
     @property
     def should_poll(self):
-        """Allows for color updates to be polled"""
-        return True
+        """Poll for color updates unless they are pushed from the primary entity"""
+        return not self.push_state_updates
 
     @property
     def name(self) -> str:
@@ -349,6 +559,31 @@ class NewLight(LightEntity):
         """Flag supported features."""
         return self._supported_features
 
+    @property
+    def extra_state_attributes(self):
+        """Expose restorable state plus command latency and switch mailbox counters
+
+        The latency and mailbox counters change with nearly every command and are left out of the recorder.
+        House-wide coalescing, outbound queue and command cache counters are on the new_light sensor platform.
+        """
+        # Restored after a restart, see _async_restore
+        attrs = {
+            "brightness_override": self._brightness_override,
+            "switched_on": self._switched_on,
+            "mode": self._mode,
+        }
+        if self._command_latency is not None:
+            attrs["command_latency_ms"] = round(self._command_latency * 1000, 1)
+        if self._setup_duration is not None:
+            attrs["setup_ms"] = self.setup_phases_ms
+        if self._motion_latency is not None:
+            attrs["motion_latency_ms"] = round(self._motion_latency * 1000, 1)
+        attrs["mailbox_depth"] = int(self._mailbox_command is not None) + int(
+            self._mailbox_pending is not None
+        )
+        attrs["mailbox_dropped"] = self._mailbox_dropped
+        return attrs
+
     @property
     def effect(self):
         return self._curr_effect
@@ -359,10 +594,86 @@ class NewLight(LightEntity):
         """Return the RightLight modes are effect options"""
         return self._effect_list
 
+    async def _outbound_call(self, domain, service, service_data=None, **kwargs):
+        """Send a service call through the outbound scheduler at the priority of the command in progress"""
+        cmd = self._current_command()
+        priority = SCHEDULED if cmd is None else cmd.priority
+
+        # Switch presses always go out, in case a bulb was power cycled behind our back
+        if self.suppress_redundant_commands and self._command_cache.check(
+            domain,
+            service,
+            service_data,
+            force=self.force_resend or priority == SWITCH or bool(kwargs),
+        ):
+            self._trace.record("skip", service=service, data=service_data)
+            return
+
+        self._trace.record(
+            "send",
+            service=service,
+            data=service_data,
+            priority=PRIORITY_NAMES[priority],
+        )
+
+        metrics = self._metrics
+        start = self.hass.loop.time()
+        if cmd is not None and cmd.since is not None:
+            metrics.event_latency.observe(start - cmd.since)
+            if cmd.priority == MOTION:
+                self._motion_latency = start - cmd.since
+            cmd.since = None
+
+        try:
+            await self._outbound.async_call(
+                priority,
+                domain,
+                service,
+                service_data,
+                observer=metrics.tick_lag.observe if priority == SCHEDULED else None,
+                **kwargs,
+            )
+        except BaseException:
+            # The command may never have reached the light
+            self._command_cache.forget(service_data)
+            raise
+
+        metrics.service_call.observe(self.hass.loop.time() - start)
+        metrics.commands[(cmd is not None and cmd.source) or PRIORITY_NAMES[priority]] += 1
+
+    @contextmanager
+    def _prioritized(self, priority, since=None):
+        """Send this light's commands at priority until the block exits, unless an outer block already set one
+
+        since is the event loop time of the event behind the commands, for the event latency histogram.
+        """
+        if self._current_command() is not None:
+            yield
+            return
+        cmd = _Command(self, priority, since)
+        token = _command.set(cmd)
+        try:
+            yield
+        finally:
+            # Tasks started inside the block and outliving it see the command as over
+            cmd.light = None
+            _command.reset(token)
+
+    def _current_command(self):
+        """The _Command this light is working on in the current task, if any"""
+        cmd = _command.get()
+        return cmd if cmd is not None and cmd.light is self else None
+
     async def async_turn_on(self, **kwargs) -> None:
         """Instruct the light to turn on."""
+        # Calls from Home Assistant itself (UI, automations) count as a switch press
+        with self._prioritized(SWITCH, self.hass.loop.time()):
+            await self._async_turn_on(**kwargs)
+
+    async def _async_turn_on(self, **kwargs) -> None:
         if self._debug:
-            _LOGGER.debug(f"{self.name} LIGHT ASYNC_TURN_ON: {kwargs}")
+            _LOGGER.debug("%s LIGHT ASYNC_TURN_ON: %s", self.name, kwargs)
+        start = self.hass.loop.time()
 
         if "brightness" in kwargs:
             self._brightness = kwargs["brightness"]
@@ -370,24 +681,20 @@ class NewLight(LightEntity):
             self._brightness = 255
 
         if self.has_brightness_threshold:
-            if self._brightness > self.brightness_threshold:
-                self._brightnessBT = 255
-                self._brightnessAT = (
-                    255
-                    * (self._brightness - self.brightness_threshold)
-                    / (255 - self.brightness_threshold)
-                )
-            else:
-                self._brightnessBT = (
-                    255 * (self._brightness) / (self.brightness_threshold)
-                )
-                self._brightnessAT = 0
+            self._brightnessBT, self._brightnessAT = self._split_brightness(
+                self._brightness
+            )
             if self._debug:
                 _LOGGER.debug(
-                    f"{self.name} LIGHT ASYNC_TURN_ON: BT: {self._brightnessBT}, AT: {self._brightnessAT}"
+                    "%s LIGHT ASYNC_TURN_ON: BT: %s, AT: %s",
+                    self.name,
+                    self._brightnessBT,
+                    self._brightnessAT,
                 )
                 _LOGGER.debug(
-                    f"{self.name} LIGHT ASYNC_TURN_ON: Entities: {self.entities.keys()}"
+                    "%s LIGHT ASYNC_TURN_ON: Entities: %s",
+                    self.name,
+                    self.entities.keys(),
                 )
 
         # Assume switched on for anything other than motion sensor sources
@@ -464,31 +771,26 @@ class NewLight(LightEntity):
             rlmode = "Normal"
         self._curr_effect = rlmode
 
+        self._trace.record(
+            "turn_on",
+            source=kwargs.get("source"),
+            brightness=self._brightness,
+            override=self._brightness_override,
+            split=(self._brightnessBT, self._brightnessAT)
+            if self.has_brightness_threshold
+            else None,
+            effect=rlmode,
+        )
+
         if self._debug:
-            _LOGGER.debug(f"{self.name} LIGHT ASYNC_TURN_ON: Data: {data}")
+            _LOGGER.debug("%s LIGHT ASYNC_TURN_ON: Data: %s", self.name, data)
 
-        f, r = self.getEntityNames()
+        r, b_ents, a_ents = self._threshold_entities()
 
         # Disable RightLight for other entities before turning on main entity
-        for ent in r:
-            await self.entities[ent].disable()
-
-        # Assume first entity if for below threhold if not explicitly set
-        if len(self.entities_below_threshold) > 0:
-            b_ents = self.entities_below_threshold
-        else:
-            b_ents = [f]
-
-        # Assume all other entities are for above threhold if not explcitly set
-        if len(self.entities_above_threshold) > 0:
-            a_ents = self.entities_above_threshold
-        else:
-            if len(r) > 0:
-                # a_ents = [r[0]]
-                a_ents = r
-            else:
-                a_ents = []
+        await self._dispatch([(ent, self.getRightLight(ent).disable()) for ent in r])
 
+        ops = []
         for ent in b_ents:
             if rl:
                 # Turn on light using RightLight
@@ -505,22 +807,29 @@ class NewLight(LightEntity):
 
                 if self._debug:
                     _LOGGER.debug(
-                        f"{self.name} LIGHT ASYNC_TURN_ON: BT RL turning on {ent}"
+                        "%s LIGHT ASYNC_TURN_ON: BT RL turning on %s", self.name, ent
                     )
 
-                await self.entities[ent].turn_on(
-                    brightness=thisbr,
-                    brightness_override=self._brightness_override,
-                    mode=rlmode,
-                    transition=data["transition"],
+                ops.append(
+                    (
+                        ent,
+                        self.getRightLight(ent).turn_on(
+                            brightness=thisbr,
+                            brightness_override=self._brightness_override,
+                            mode=rlmode,
+                            transition=data["transition"],
+                        ),
+                    )
                 )
             else:
                 # Use for other modes, like specific color or temperatures
                 if self._debug:
                     _LOGGER.debug(
-                        f"{self.name} LIGHT ASYNC_TURN_ON: BT RL_specific turning on {ent}"
+                        "%s LIGHT ASYNC_TURN_ON: BT RL_specific turning on %s",
+                        self.name,
+                        ent,
                     )
-                await self.entities[ent].turn_on_specific(data)
+                ops.append((ent, self.getRightLight(ent).turn_on_specific(data)))
 
         if self.has_brightness_threshold:
             for ent in a_ents:
@@ -530,9 +839,11 @@ class NewLight(LightEntity):
                     if self._brightnessAT == 0:
                         if self._debug:
                             _LOGGER.debug(
-                                f"{self.name} LIGHT ASYNC_TURN_ON: AT RL turning off {ent}"
+                                "%s LIGHT ASYNC_TURN_ON: AT RL turning off %s",
+                                self.name,
+                                ent,
                             )
-                        await self.entities[ent].disable_and_turn_off()
+                        ops.append((ent, self.getRightLight(ent).disable_and_turn_off()))
                     else:
                         if ent in self.brightness_multiplier:
                             thisbr = (
@@ -543,21 +854,33 @@ class NewLight(LightEntity):
 
                         if self._debug:
                             _LOGGER.debug(
-                                f"{self.name} LIGHT ASYNC_TURN_ON: AT RL turning on {ent}"
+                                "%s LIGHT ASYNC_TURN_ON: AT RL turning on %s",
+                                self.name,
+                                ent,
+                            )
+                        ops.append(
+                            (
+                                ent,
+                                self.getRightLight(ent).turn_on(
+                                    brightness=thisbr,
+                                    brightness_override=self._brightness_override,
+                                    mode=rlmode,
+                                    transition=data["transition"],
+                                ),
                             )
-                        await self.entities[ent].turn_on(
-                            brightness=thisbr,
-                            brightness_override=self._brightness_override,
-                            mode=rlmode,
-                            transition=data["transition"],
                         )
                 else:
                     # Use for other modes, like specific color or temperatures
                     if self._debug:
                         _LOGGER.debug(
-                            f"{self.name} LIGHT ASYNC_TURN_ON: AT RL_specific turning on {ent}"
+                            "%s LIGHT ASYNC_TURN_ON: AT RL_specific turning on %s",
+                            self.name,
+                            ent,
                         )
-                    await self.entities[ent].turn_on_specific(data)
+                    ops.append((ent, self.getRightLight(ent).turn_on_specific(data)))
+
+        await self._dispatch(ops)
+        self._command_latency = self.hass.loop.time() - start
 
         self.async_schedule_update_ha_state(force_refresh=True)
 
@@ -566,8 +889,163 @@ class NewLight(LightEntity):
         k = list(self.entities.keys())
         return k[0], k[1:]
 
+    def _split_brightness(self, brightness):
+        """Split brightness into (below threshold, above threshold) entity brightnesses"""
+        if brightness > self.brightness_threshold:
+            return 255, (
+                255
+                * (brightness - self.brightness_threshold)
+                / (255 - self.brightness_threshold)
+            )
+        return 255 * (brightness) / (self.brightness_threshold), 0
+
+    def _threshold_entities(self):
+        """Return (other entities, below threshold entities, above threshold entities)"""
+        f, r = self.getEntityNames()
+
+        # Assume first entity if for below threhold if not explicitly set
+        if len(self.entities_below_threshold) > 0:
+            b_ents = self.entities_below_threshold
+        else:
+            b_ents = [f]
+
+        # Assume all other entities are for above threhold if not explcitly set
+        if len(self.entities_above_threshold) > 0:
+            a_ents = self.entities_above_threshold
+        else:
+            if len(r) > 0:
+                # a_ents = [r[0]]
+                a_ents = r
+            else:
+                a_ents = []
+
+        return r, b_ents, a_ents
+
+    def _build_motion_plan(self):
+        """Work out ahead of time which RightLight calls a motion sensor turn on makes for each entity.
+
+        Returns (entities to disable, (entity, RightLight.turn_on kwargs or None to turn off) operations, below
+        threshold brightness, above threshold brightness), matching what async_turn_on(brightness=
+        motion_sensor_brightness, source="MotionSensor") would do.  Everything here comes from configuration,
+        so the plan is built once and only rebuilt when the entities change.  RightLight still works out the
+        light values for the time of the motion event.
+        """
+        br = self.motion_sensor_brightness
+        bt, at = self._split_brightness(br)
+        r, b_ents, a_ents = self._threshold_entities()
+        base = {"mode": "Normal", "transition": self.motion_sensor_transition}
+
+        ops = []
+        for ent in b_ents:
+            thisbr = bt if self.has_brightness_threshold else br
+            if ent in self.brightness_multiplier:
+                thisbr = thisbr * self.brightness_multiplier[ent]
+            ops.append((ent, dict(base, brightness=thisbr)))
+
+        if self.has_brightness_threshold:
+            for ent in a_ents:
+                if at == 0:
+                    ops.append((ent, None))
+                else:
+                    thisbr = at
+                    if ent in self.brightness_multiplier:
+                        thisbr = thisbr * self.brightness_multiplier[ent]
+                    ops.append((ent, dict(base, brightness=thisbr)))
+
+        return tuple(r), tuple(ops), bt, at
+
+    async def _async_motion_turn_on(self) -> None:
+        """Turn on for a motion sensor using the precomputed plan.
+
+        Same effect as async_turn_on(brightness=motion_sensor_brightness, source="MotionSensor") without
+        redoing the brightness threshold and multiplier work.
+        """
+        start = self.hass.loop.time()
+        if self._motion_plan is None:
+            self._motion_plan = self._build_motion_plan()
+        r, ops, bt, at = self._motion_plan
+
+        self._brightness = self.motion_sensor_brightness
+        if self.has_brightness_threshold:
+            self._brightnessBT, self._brightnessAT = bt, at
+        self._is_on = True
+        self._mode = "On"
+        self._curr_effect = "Normal"
+        self._trace.record(
+            "motion_on",
+            brightness=self._brightness,
+            override=self._brightness_override,
+            split=(bt, at),
+        )
+
+        await self._dispatch([(ent, self.getRightLight(ent).disable()) for ent in r])
+
+        cmds = []
+        for ent, kwargs in ops:
+            rl = self.getRightLight(ent)
+            if kwargs is None:
+                cmds.append((ent, rl.disable_and_turn_off()))
+            else:
+                cmds.append(
+                    (
+                        ent,
+                        rl.turn_on(
+                            brightness_override=self._brightness_override, **kwargs
+                        ),
+                    )
+                )
+        await self._dispatch(cmds)
+
+        self._command_latency = self.hass.loop.time() - start
+
+        self.async_schedule_update_ha_state(force_refresh=True)
+
+    async def _dispatch(self, ops) -> None:
+        """Await a list of (entity, coroutine) operations.
+
+        Operations on the same entity always run in the order given.  With concurrent_dispatch enabled,
+        different entities run in parallel, at most max_concurrent_commands at a time.  A failure on one
+        entity is logged and does not stop the others.
+        """
+        chains = OrderedDict()
+        for ent, coro in ops:
+            chains.setdefault(ent, []).append(coro)
+
+        async def run_chain(ent, coros, sem=None):
+            for i, coro in enumerate(coros):
+                try:
+                    if sem is None:
+                        await coro
+                    else:
+                        async with sem:
+                            await coro
+                except asyncio.CancelledError:
+                    for c in coros[i + 1 :]:
+                        c.close()
+                    raise
+                except Exception as err:  # pylint: disable=broad-except
+                    _LOGGER.error("%s error commanding %s: %r", self.name, ent, err)
+                    # Skip this entity's remaining operations
+                    for c in coros[i + 1 :]:
+                        c.close()
+                    return
+
+        if not self.concurrent_dispatch or len(chains) < 2:
+            for ent, coros in chains.items():
+                await run_chain(ent, coros)
+            return
+
+        sem = asyncio.Semaphore(self.max_concurrent_commands)
+        await asyncio.gather(
+            *(run_chain(ent, coros, sem) for ent, coros in chains.items())
+        )
+
     async def async_turn_on_mode(self, **kwargs: Any) -> None:
         """Turn on one of RightLight's color modes"""
+        with self._prioritized(SWITCH, self.hass.loop.time()):
+            await self._async_turn_on_mode(**kwargs)
+
+    async def _async_turn_on_mode(self, **kwargs: Any) -> None:
         self._mode = kwargs.get("mode", "Vivid")
         self._is_on = True
         self._brightness = 255
@@ -575,34 +1053,44 @@ class NewLight(LightEntity):
 
         f, r = self.getEntityNames()
         # Disable RightLight for other entities before turning on main entity
-        for ent in r:
-            await self.entities[ent].disable()
+        await self._dispatch([(ent, self.getRightLight(ent).disable()) for ent in r])
         if self._debug:
             _LOGGER.debug(
-                f"{self.name} LIGHT ASYNC_TURN_ON_MODE turning on {f} to mode {self._mode}"
+                "%s LIGHT ASYNC_TURN_ON_MODE turning on %s to mode %s",
+                self.name,
+                f,
+                self._mode,
             )
-        await self.entities[f].turn_on(mode=self._mode)
+        await self.getRightLight(f).turn_on(mode=self._mode)
 
         self.async_schedule_update_ha_state(force_refresh=True)
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """Instruct the light to turn off, conditionally."""
-        self._occupancy = any(self._occupancies.values())
+        with self._prioritized(SWITCH, self.hass.loop.time()):
+            await self._async_turn_off(**kwargs)
 
-        if self._debug:
-            _LOGGER.debug(
-                f"{self.name} LIGHT ASYNC_TURN_OFF: {kwargs, self._switched_on, self._occupancy}"
-            )
+    async def _async_turn_off(self, **kwargs: Any) -> None:
+        if self._occupancy_group is not None:
+            self._occupancy = self._occupancy_group.occupied
+
+        self._trace.record(
+            "turn_off",
+            source=kwargs.get("source"),
+            switched_on=self._switched_on,
+            occupancy=self._occupancy,
+        )
 
         # If the light wasn't switched on, or if there is no occupancy, turn off
         if (self._switched_on == False) or (self._occupancy == False):
             if self._debug:
-                _LOGGER.debug(f"{self.name} LIGHT ASYNC_TURN_OFF: Turning off")
+                _LOGGER.debug("%s LIGHT ASYNC_TURN_OFF: Turning off", self.name)
             await self._async_turn_off_helper(**kwargs)
         elif self._occupancy:
             if self._debug:
                 _LOGGER.debug(
-                    f"{self.name} LIGHT ASYNC_TURN_OFF: Switching to motion sensor mode"
+                    "%s LIGHT ASYNC_TURN_OFF: Switching to motion sensor mode",
+                    self.name,
                 )
             self._switched_on = False
 
@@ -610,12 +1098,11 @@ class NewLight(LightEntity):
             if any(self.motion_disable_trackers.values()):
                 await self._async_turn_off_helper(**kwargs)
             else:
-                await self.async_turn_on(
-                    brightness=self.motion_sensor_brightness, source="MotionSensor"
-                )
+                await self._async_motion_turn_on()
 
     async def _async_turn_off_helper(self, **kwargs: Any) -> None:
         """Instruct the light to turn off."""
+        start = self.hass.loop.time()
         self._brightness = 0
         self._brightness_override = 0
         self._is_on = False
@@ -634,20 +1121,35 @@ class NewLight(LightEntity):
 
         f, r = self.getEntityNames()
         # Disable other entities before turning off main entity
+        ops = []
         for ent in r:
             if self._debug:
                 _LOGGER.debug(
-                    f"{self.name} LIGHT ASYNC_TURN_OFF_HELPER turning off {ent}"
+                    "%s LIGHT ASYNC_TURN_OFF_HELPER turning off %s", self.name, ent
                 )
-            await self.entities[ent].disable_and_turn_off(**kwargs)
+            ops.append((ent, self.getRightLight(ent).disable_and_turn_off(**kwargs)))
+        await self._dispatch(ops)
         if self._debug:
-            _LOGGER.debug(f"{self.name} LIGHT ASYNC_TURN_OFF_HELPER turning off {f}")
-        await self.entities[f].disable_and_turn_off(**kwargs)
+            _LOGGER.debug("%s LIGHT ASYNC_TURN_OFF_HELPER turning off %s", self.name, f)
+        await self._dispatch([(f, self.getRightLight(f).disable_and_turn_off(**kwargs))])
+        self._command_latency = self.hass.loop.time() - start
 
         self.async_schedule_update_ha_state(force_refresh=True)
 
     async def up_brightness(self, **kwargs) -> None:
         """Increase brightness by one step"""
+        self._step_brightness_up()
+        await self.async_turn_on(brightness=self._brightness, **kwargs)
+
+    async def down_brightness(self, **kwargs) -> None:
+        """Decrease brightness by one step"""
+        if self._step_brightness_down():
+            await self.async_turn_off(**kwargs)
+        else:
+            await self.async_turn_on(brightness=self._brightness, **kwargs)
+
+    def _step_brightness_up(self) -> None:
+        """Apply one brightness step up to the light's state"""
         if self._brightness == None:
             self._brightness = self.brightness_step
         elif self._brightness > (255 - self.brightness_step):
@@ -656,20 +1158,60 @@ class NewLight(LightEntity):
         else:
             self._brightness = self._brightness + self.brightness_step
 
-        await self.async_turn_on(brightness=self._brightness, **kwargs)
-
-    async def down_brightness(self, **kwargs) -> None:
-        """Decrease brightness by one step"""
+    def _step_brightness_down(self) -> bool:
+        """Apply one brightness step down to the light's state.  Returns True if the light should turn off"""
         if self._brightness == None:
-            await self.async_turn_off(**kwargs)
+            return True
         elif self._brightness_override > 0:
             self._brightness_override = 0
-            await self.async_turn_on(brightness=self._brightness, **kwargs)
         elif self._brightness < self.brightness_step:
-            await self.async_turn_off(**kwargs)
+            return True
         else:
             self._brightness = self._brightness - self.brightness_step
-            await self.async_turn_on(brightness=self._brightness, **kwargs)
+        return False
+
+    def _post(self, func, **kwargs) -> None:
+        """Run a switch command through this light's latest-wins mailbox.
+
+        A newer command replaces one still waiting to run and cancels the one in flight, so a burst of presses
+        only sends the final brightness or mode to the bulbs.  Commands should be absolute (a target brightness,
+        not a step) since superseded ones never run.
+        """
+        self._mailbox_posted += 1
+        if self._mailbox_pending is not None:
+            self._mailbox_dropped += 1
+        self._mailbox_pending = (func, kwargs, self.hass.loop.time())
+
+        command = self._mailbox_command
+        if command is not None and not command.done() and not command.cancelling():
+            self._mailbox_dropped += 1
+            command.cancel()
+
+        if self._mailbox_task is None or self._mailbox_task.done():
+            self._mailbox_task = self.hass.async_create_task(self._mailbox_worker())
+
+    async def _mailbox_worker(self) -> None:
+        """Run mailbox commands until none are left, each in a task of its own that _post can cancel"""
+        while self._mailbox_pending is not None:
+            func, kwargs, since = self._mailbox_pending
+            self._mailbox_pending = None
+            with self._prioritized(SWITCH, since):
+                command = self.hass.async_create_task(func(**kwargs))
+                self._mailbox_command = command
+                try:
+                    await asyncio.wait([command])
+                finally:
+                    # Also stops the command if the worker itself is cancelled
+                    command.cancel()
+                    self._mailbox_command = None
+
+            if command.cancelled():
+                if self._debug:
+                    _LOGGER.debug("%s mailbox: superseded %s", self.name, func.__name__)
+            elif command.exception() is not None:
+                _LOGGER.error(
+                    "%s error running %s: %r", self.name, func.__name__, command.exception()
+                )
 
     async def async_update(self):
         """Query light and determine the state."""
@@ -677,11 +1219,20 @@ class NewLight(LightEntity):
         #    _LOGGER.debug(f"{self.name} LIGHT ASYNC_UPDATE")
 
         f, r = self.getEntityNames()
-        state = self.hass.states.get(f)
+        self._mirror_state(self.hass.states.get(f))
 
+    def _mirror_state(self, state) -> bool:
+        """Copy color attributes from the primary entity's state.  Returns True if anything changed"""
         if state == None:
-            return
-
+            return False
+
+        old = (
+            self._hs_color,
+            self._rgb_color,
+            self._color_temp,
+            self._min_mireds,
+            self._max_mireds,
+        )
         self._hs_color = state.attributes.get(ATTR_HS_COLOR, self._hs_color)
         self._rgb_color = state.attributes.get(ATTR_RGB_COLOR, self._rgb_color)
         self._color_temp = state.attributes.get(ATTR_COLOR_TEMP, self._color_temp)
@@ -689,14 +1240,46 @@ class NewLight(LightEntity):
         self._max_mireds = state.attributes.get(ATTR_MAX_MIREDS, 500)
         # self._effect_list = state.attributes.get(ATTR_EFFECT_LIST)
 
-        # Reload JSON buttonmap regularly
-        if os.path.exists(self._button_map_file):
-            ts = os.path.getmtime(self._button_map_file)
-            if ts > self._button_map_timestamp:
-                if self._debug:
-                    _LOGGER.debug(f"{self.name} loading JSON button map file")
-                self._button_map_data = json.load(open(self._button_map_file))
-                self._button_map_timestamp = ts
+        return old != (
+            self._hs_color,
+            self._rgb_color,
+            self._color_temp,
+            self._min_mireds,
+            self._max_mireds,
+        )
+
+    @callback
+    def _primary_state_update(self, this_event) -> None:
+        """Mirror a state change of the primary entity (push mode)"""
+        if self._mirror_state(this_event.data.get("new_state")):
+            self.async_write_ha_state()
+
+    @callback
+    def _button_map_updated(self, table) -> None:
+        """Take a newly compiled JSON button map from the shared loader"""
+        if self._debug:
+            _LOGGER.debug("%s loading JSON button map file", self.name)
+
+        # Color mode names can only be checked against RightLight
+        f, r = self.getEntityNames()
+        modes = self.getRightLight(f).getColorModes()
+        for payload, steps in table.items():
+            for step in steps:
+                for action in step:
+                    if not isinstance(action, RightLightAction):
+                        continue
+                    mode = action.kwargs.get("mode")
+                    if mode is not None and mode not in modes:
+                        _LOGGER.error(
+                            "%s error - button_map.json '%s' uses unknown RightLight mode %s, ignoring map",
+                            self.name,
+                            payload,
+                            mode,
+                        )
+                        return
+
+        self._button_map_data = table
+        self.clearButtonCounts()
 
     @callback
     async def switch_message_received(self, mqttmsg) -> None:
@@ -707,105 +1290,76 @@ class NewLight(LightEntity):
             if dev != self.switch:
                 return
             payload = mqttmsg.data.get("command")
-            if self._debug:
-                _LOGGER.debug(f"{self.name} switch: {payload}")
         else:
-            topic, payload, qos = mqttmsg.topic, mqttmsg.payload, mqttmsg.qos
-            if self._debug:
-                _LOGGER.debug(f"{self.name} switch: {topic}, {payload}, {qos}")
+            payload = mqttmsg.payload
 
         if "release" in payload:
             return
+        self._trace.record("switch", payload=payload)
 
         if ("hold" in payload) and (payload in self._button_map_data):
             # JSON found for this button press
-            config_list = self._button_map_data[payload]
-            this_list = config_list[self._buttonCounts[payload]]
-
-            # Increment button count and loop to zero.  Zero out the other buttons' counts
-            self._buttonCounts[payload] += 1
-            if self._buttonCounts[payload] >= len(config_list):
-                self._buttonCounts[payload] = 0
-            for key in self._buttonCounts.keys():
-                if key != payload:
-                    self._buttonCounts[key] = 0
-
-            for command in this_list:
-                self._switched_on = True
-
-                if self._debug:
-                    _LOGGER.error(f"{self.name} JSON Switch command: {command}")
-                if command[0] == "Brightness":
-                    ent = command[1]
-                    br = command[2]
-
-                    if br == 0:
-                        await self.hass.services.async_call(
-                            "light", "turn_off", {"entity_id": ent}
-                        )
-                    else:
-                        await self.hass.services.async_call(
-                            "light", "turn_on", {"entity_id": ent, "brightness": br}
-                        )
-                elif command[0] == "RightLight":
-                    ent = command[1]
-                    val = command[2]
-
-                    if not ent in self.entities:
-                        self.entities[ent] = RightLight(ent, self.hass, self._debug_rl)
-
-                    rl = self.entities[ent]
+            steps = self._button_map_data[payload]
 
-                    if val == "Disable":
-                        await rl.disable()
-                    elif val in rl.getColorModes():
-                        await rl.turn_on(mode=val)
-                    elif (val == 0) or (val == "Off"):
-                        await rl.disable_and_turn_off()
-                    else:
-                        await rl.turn_on(brightness=val, brightness_override=0)
-                elif command[0] == "Color":
-                    ent = command[1]
-                    r, g, b = command[2:]
-                    br = sum([r, g, b]) / 3
-
-                    if not ent in self.entities:
-                        self.entities[ent] = RightLight(ent, self.hass, self._debug_rl)
-
-                    rl = self.entities[ent]
-                    await rl.turn_on_specific(
-                        {"entity_id": ent, "rgb_color": [r, g, b], "brightness": br}
-                    )
+            # Repeated holds of the same button step through its list, anything else starts it over
+            last, index = self._button_seq
+            if last != payload:
+                index = 0
+            self._button_seq = (payload, (index + 1) % len(steps))
 
-                elif command[0] == "Scene":
-                    await self.hass.services.async_call(
-                        "scene", "turn_on", {"entity_id": command[1]}
-                    )
-                else:
-                    _LOGGER.error(
-                        f"{self.name} error - unrecognized button_map.json command type: {command[0]}"
-                    )
+            if steps[index]:
+                self._switched_on = True
+            self._post(self._run_button_actions, actions=steps[index])
 
         elif payload.startswith("on"):  # and "press" in payload:
             self.clearButtonCounts()
             self._brightness_override = 0
-            await self.async_turn_on(source="Switch", brightness=255)
+            self._post(self.async_turn_on, source="Switch", brightness=255)
         elif payload.startswith("up"):  # and "press" in payload:
             self.clearButtonCounts()
-            await self.up_brightness(source="Switch")
+            # Step brightness now so every press counts, even if its command gets superseded
+            self._step_brightness_up()
+            self._post(self.async_turn_on, source="Switch", brightness=self._brightness)
         elif payload.startswith("down"):  # and "press" in payload:
             self.clearButtonCounts()
-            await self.down_brightness(source="Switch")
+            if self._step_brightness_down():
+                self._post(self.async_turn_off, source="Switch")
+            else:
+                self._post(
+                    self.async_turn_on, source="Switch", brightness=self._brightness
+                )
         elif payload.startswith("off"):  # and "press" in payload:
             self.clearButtonCounts()
-            await self.async_turn_off(source="Switch")
+            self._post(self.async_turn_off, source="Switch")
         else:
             if self._debug:
-                _LOGGER.error(f"{self.name} switch handler fail: {payload}")
+                _LOGGER.error("%s switch handler fail: %s", self.name, payload)
+
+    async def _run_button_actions(self, actions) -> None:
+        """Run one step of a compiled JSON button map"""
+        with self._prioritized(SWITCH):
+            self._current_command().source = "button_map"
+            for action in actions:
+                if self._debug:
+                    _LOGGER.error("%s JSON Switch command: %s", self.name, action)
+                await action.run(self)
+
+    def getRightLight(self, ent):
+        """Return the RightLight object for an entity, creating it if needed"""
+        rl = self.entities.get(ent)
+        if rl is None:
+            if not ent in self.entities:
+                # A new entity changes which entities the motion plan disables
+                self._motion_plan = None
+            rl = self.entities[ent] = RightLight(
+                ent, self._hass_view, self._debug_rl, now=get_clock(self.hass).now
+            )
+            if self.schedule_optimizer is not None:
+                rl.setScheduleOptimizer(self.schedule_optimizer)
+        return rl
 
     def clearButtonCounts(self):
-        for key in self._buttonCounts.keys():
-            self._buttonCounts[key] = 0
+        self._button_seq = (None, 0)
 
     #    @callback
     #    async def json_switch_message_received(
@@ -869,74 +1423,15 @@ class NewLight(LightEntity):
     #                        f"{self.name} error - unrecognized button_map.json command type: {command[0]}"
     #                    )
 
-    @callback
-    async def motion_sensor_message_received(self, mqttmsg) -> None:
-        """A new MQTT message has been received."""
-        # async def motion_sensor_message_received( self, topic: str, payload: str, qos: int) -> None:
-        topic, payload, qos = mqttmsg.topic, mqttmsg.payload, mqttmsg.qos
-
-        payload = json.loads(payload)
-        z, ms = topic.split("/")
-
-        if not ms in self._occupancies:
-            _LOGGER.error(f"{self.name}: Unexpected motion sensor name: {ms}")
-            return
-
-        if self._occupancies[ms] == payload["occupancy"]:
-            # No change to state
-            return
-
-        if self._debug:
-            _LOGGER.error(f"{self.name} motion sensor: {topic}, {payload}, {qos}")
-
-        self._occupancies[ms] = payload["occupancy"]
-        self._occupancy = any(self._occupancies.values())
-
-        if self._debug:
-            _LOGGER.debug(
-                f"{self.name} motion sensor: Occ: {self._occupancies} => {self._occupancy}"
-            )
-
-        # Disable motion sensor tracking if the lights are switched on or the harmony is on
-        # if self._switched_on or ((self.harmony_entity != None) and self._harmony_on):
-        #    return
-        if self._switched_on or any(self.motion_disable_trackers.values()):
-            return
-
-        if self._occupancy:
-            await self.async_turn_on(
-                brightness=self.motion_sensor_brightness, source="MotionSensor"
-            )
-        else:
-            await self.async_turn_off(source="MotionSensor")
-
-    @callback
-    async def motion_sensor_message_received_zha(self, ev) -> None:
-        if self._debug:
-            _LOGGER.debug(f"{self.name} motion sensor: {ev}")
-        payload = ev.data.get("new_state").state
-        dev = ev.data.get("entity_id")
-        if self._debug:
-            _LOGGER.debug(f"{self.name} motion sensor payload: {payload}")
-
-        payload = payload == "on"
-
-        if not dev in self._occupancies:
-            _LOGGER.error(f"{self.name}: Unexpected motion sensor name: {dev}")
-            return
-
-        """A new MQTT message has been received."""
-        if self._occupancies[dev] == payload:
-            # No change to state
-            return
-
-        self._occupancies[dev] = payload
-        self._occupancy = any(self._occupancies.values())
-
-        if self._debug:
-            _LOGGER.debug(
-                f"{self.name} motion sensor: Occ: {self._occupancies} => {self._occupancy}"
-            )
+    async def motion_occupancy_changed(self, occupied) -> None:
+        """The combined occupancy of this light's motion sensors has flipped"""
+        self._occupancy = occupied
+        self._trace.record(
+            "motion",
+            occupied=occupied,
+            switched_on=self._switched_on,
+            disabled=any(self.motion_disable_trackers.values()),
+        )
 
         # Disable motion sensor tracking if the lights are switched on a motion_disable_entity is on
         # if self._switched_on or ((self.harmony_entity != None) and self._harmony_on):
@@ -944,12 +1439,11 @@ class NewLight(LightEntity):
         if self._switched_on or any(self.motion_disable_trackers.values()):
             return
 
-        if self._occupancy:
-            await self.async_turn_on(
-                brightness=self.motion_sensor_brightness, source="MotionSensor"
-            )
-        else:
-            await self.async_turn_off(source="MotionSensor")
+        with self._prioritized(MOTION, self._occupancy_group.changed_at):
+            if self._occupancy:
+                await self._async_motion_turn_on()
+            else:
+                await self.async_turn_off(source="MotionSensor")
 
     # @callback
     # async def harmony_update(self, this_event):
@@ -966,7 +1460,7 @@ class NewLight(LightEntity):
         """Track updates on motion_disable_entities"""
         ev = this_event.as_dict()
         if self._debug:
-            _LOGGER.debug(f"{self.name}: motion_disable_entitiy_update: {ev}")
+            _LOGGER.debug("%s: motion_disable_entitiy_update: %s", self.name, ev)
 
         ent = ev["data"]["entity_id"]
         ns = ev["data"]["new_state"].state
@@ -978,10 +1472,11 @@ class NewLight(LightEntity):
     @callback
     async def other_entity_update(self, this_event):
         """Track events of other entities"""
-        ev = this_event.as_dict()
-        if self._debug:
-            _LOGGER.error(f"{self.name} other entity update: {ev}")
+        with self._prioritized(TRACKER, self.hass.loop.time()):
+            await self._other_entity_update(this_event)
 
+    async def _other_entity_update(self, this_event):
+        ev = this_event.as_dict()
         ent = ev["data"]["entity_id"]
         ns = ev["data"]["new_state"].state
 
@@ -989,6 +1484,7 @@ class NewLight(LightEntity):
             br = ev["data"]["new_state"].attributes["brightness"]
         else:
             br = 255
+        self._trace.record("tracker", entity=ent, state=ns, brightness=br)
 
         if ns == "on":
             # Grab other light's brightness
@@ -1007,7 +1503,7 @@ class NewLight(LightEntity):
 
             # Feature to turn off other lights when this light goes on
             if self.turn_off_other_lights:
-                await self.hass.services.async_call(
+                await self._hass_view.services.async_call(
                     "light", "turn_off", {"entity_id": ent}
                 )
         elif self.track_other_light_off_events and ns == "off":
@@ -0,0 +1,161 @@
+"""Motion sensor occupancy shared by every light watching a sensor"""
+from __future__ import annotations
+
+import json
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import event
+
+from .const import DOMAIN
+from .router import get_mqtt_router
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class OccupancyGroup:
+    """A set of sensors whose combined occupancy one light follows"""
+
+    __slots__ = ("sensors", "action", "occupied_count", "changed_at")
+
+    def __init__(self, sensors, action, occupied_count) -> None:
+        self.sensors = tuple(sensors)
+        self.action = action
+        self.occupied_count = occupied_count
+        """Number of this group's sensors currently reporting occupancy"""
+        self.changed_at = None
+        """Event loop time of the sensor message that last flipped this group"""
+
+    @property
+    def occupied(self) -> bool:
+        return self.occupied_count > 0
+
+
+class OccupancyService:
+    """Decode each motion sensor message once and notify only lights whose occupancy flipped
+
+    zigbee2mqtt sensors are taken from the shared MQTT router, anything with 'binary_sensor' in its name is
+    tracked through its Home Assistant state.  Each sensor is subscribed to once however many lights use it,
+    and groups keep a count of occupied sensors rather than re-scanning them all on every change.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._states = {}
+        """sensor => last reported occupancy"""
+        self._groups = {}
+        """sensor => list of OccupancyGroups containing it"""
+        self._unsubs = {}
+        """sensor => unsubscribe from its source"""
+        self._occupied_count = 0
+
+    @property
+    def house_occupied(self) -> bool:
+        """True if any watched sensor reports occupancy"""
+        return self._occupied_count > 0
+
+    def is_occupied(self, sensor) -> bool:
+        """Last reported occupancy of one sensor"""
+        return self._states.get(sensor, False)
+
+    @property
+    def occupied_sensors(self) -> list:
+        """Names of all sensors currently reporting occupancy"""
+        return [ms for ms, occ in self._states.items() if occ]
+
+    async def async_watch(self, sensors, action):
+        """Call coroutine function action(occupied) whenever the combined occupancy of sensors flips.
+
+        Returns an (OccupancyGroup, unwatch function) pair.  The group starts from the sensors' current
+        occupancy, without calling action.
+        """
+        for ms in sensors:
+            if ms not in self._unsubs:
+                self._seed(ms)
+
+        group = OccupancyGroup(
+            sensors, action, sum(self._states.get(ms, False) for ms in sensors)
+        )
+        for ms in group.sensors:
+            self._groups.setdefault(ms, []).append(group)
+            if ms not in self._unsubs:
+                # Claim the sensor before awaiting so concurrent watchers don't subscribe twice
+                self._unsubs[ms] = None
+                self._unsubs[ms] = await self._async_subscribe(ms)
+
+        @callback
+        def unwatch() -> None:
+            for ms in group.sensors:
+                groups = self._groups.get(ms, [])
+                if group in groups:
+                    groups.remove(group)
+                if not groups and ms in self._unsubs:
+                    self._groups.pop(ms, None)
+                    unsub = self._unsubs.pop(ms)
+                    if unsub is not None:
+                        unsub()
+
+        return group, unwatch
+
+    def _seed(self, ms) -> None:
+        """Start tracking a sensor from its current Home Assistant state, if it has one"""
+        if "binary_sensor" not in ms:
+            # zigbee2mqtt sensors are only known from their next message
+            self._states.setdefault(ms, False)
+            return
+        state = self._hass.states.get(ms)
+        occupied = state is not None and state.state == "on"
+        self._occupied_count += occupied - self._states.get(ms, False)
+        self._states[ms] = occupied
+
+    async def _async_subscribe(self, ms):
+        if "binary_sensor" in ms:
+            return event.async_track_state_change_event(
+                self._hass, ms, self._zha_state_changed
+            )
+        return await get_mqtt_router(self._hass).async_register(
+            f"zigbee2mqtt/{ms}", self._mqtt_message_received
+        )
+
+    async def _mqtt_message_received(self, mqttmsg) -> None:
+        try:
+            occ = json.loads(mqttmsg.payload).get("occupancy")
+        except (ValueError, AttributeError):
+            _LOGGER.error("Unreadable motion sensor message on %s", mqttmsg.topic)
+            return
+
+        # Sensors also report battery, illuminance etc. without occupancy
+        if occ is not None:
+            self.update(mqttmsg.topic.split("/", 1)[1], bool(occ))
+
+    @callback
+    def _zha_state_changed(self, ev) -> None:
+        new_state = ev.data.get("new_state")
+        if new_state is not None:
+            self.update(ev.data.get("entity_id"), new_state.state == "on")
+
+    @callback
+    def update(self, ms, occupied) -> None:
+        """Record a sensor's occupancy and notify groups whose combined occupancy flipped"""
+        if self._states.get(ms, False) == occupied:
+            # No change to state
+            return
+        self._states[ms] = occupied
+
+        now = self._hass.loop.time()
+        step = 1 if occupied else -1
+        self._occupied_count += step
+        for group in self._groups.get(ms, []):
+            was = group.occupied
+            group.occupied_count += step
+            if group.occupied != was:
+                group.changed_at = now
+                self._hass.async_create_task(group.action(group.occupied))
+
+
+def get_occupancy_service(hass: HomeAssistant) -> OccupancyService:
+    """Return the OccupancyService shared by every NewLight"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "occupancy" not in data:
+        data["occupancy"] = OccupancyService(hass)
+    return data["occupancy"]
@@ -0,0 +1,110 @@
+"""Optional trip point simplification to trade color fidelity for fewer light commands"""
+import math
+
+# Each trip point costs a turn_on plus the scheduled transition to the next point
+commands_per_trip_point = 2
+
+# Longest transition Home Assistant passes on to a light (light.VALID_TRANSITION), longer ones are clamped to it
+max_device_transition = 6553
+
+
+class ScheduleOptimizer:
+    """Merge trip points the light can interpolate to anyway and cap transition lengths
+
+    A trip point is dropped when the straight blend between the points either side of it stays within the
+    tolerances at every dropped point: rgb_tolerance per channel for the color modes, kelvin_tolerance and
+    brightness_tolerance (0-255) for Normal.  Transitions longer than max_transition seconds are split with
+    interpolated points so no light is asked for more than its hardware supports, by default the longest
+    transition Home Assistant accepts.  Optimizers with the same
+    settings compare equal, so the timeline store can share their output between lights.
+    """
+
+    __slots__ = ("rgb_tolerance", "kelvin_tolerance", "brightness_tolerance", "max_transition")
+
+    def __init__(self, rgb_tolerance=0, kelvin_tolerance=0, brightness_tolerance=0, max_transition=max_device_transition) -> None:
+        self.rgb_tolerance = rgb_tolerance
+        self.kelvin_tolerance = kelvin_tolerance
+        self.brightness_tolerance = brightness_tolerance
+        self.max_transition = max_transition
+
+    def _key(self):
+        return (self.rgb_tolerance, self.kelvin_tolerance, self.brightness_tolerance, self.max_transition)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ScheduleOptimizer) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return "ScheduleOptimizer(rgb={}, kelvin={}, brightness={}, max_transition={})".format(*self._key())
+
+    def apply(self, timelines):
+        """Return a new {mode: Timeline} dictionary with every mode simplified"""
+        out = {}
+        for mode, timeline in timelines.items():
+            if mode == "Normal":
+                tolerance = (self.kelvin_tolerance, self.brightness_tolerance)
+            else:
+                tolerance = (self.rgb_tolerance,) * len(timeline.value(0))
+            out[mode] = self.simplify(timeline, tolerance)
+        return out
+
+    def simplify(self, timeline, tolerance):
+        """Return a copy of timeline with redundant trip points removed and long transitions split"""
+        times = timeline.times
+        values = [timeline.value(i) for i in range(len(timeline))]
+        cap = self.max_transition or math.inf
+
+        # Greedily stretch each segment as far as the tolerance and transition cap allow
+        keep = [0]
+        i = 0
+        while i < len(values) - 1:
+            j = i + 1
+            while (j + 1 < len(values) and times[j + 1] - times[i] <= cap
+                   and self._fits(times, values, i, j + 1, tolerance)):
+                j += 1
+            keep.append(j)
+            i = j
+
+        new_times = []
+        new_values = []
+        for a, b in zip(keep, keep[1:]):
+            new_times.append(times[a])
+            new_values.append(values[a])
+
+            # Split segments that are still longer than the cap, which merging never creates
+            span = times[b] - times[a]
+            parts = math.ceil(span / cap) if span > cap else 1
+            for p in range(1, parts):
+                ratio = p / parts
+                new_times.append(times[a] + span * ratio)
+                new_values.append(tuple(va + (vb - va) * ratio for va, vb in zip(values[a], values[b])))
+        new_times.append(times[keep[-1]])
+        new_values.append(values[keep[-1]])
+
+        palette = list(dict.fromkeys(new_values))
+        index = {val: n for n, val in enumerate(palette)}
+        return type(timeline)(new_times, palette, [index[val] for val in new_values])
+
+    @staticmethod
+    def _fits(times, values, a, b, tolerance) -> bool:
+        """True if blending straight from point a to point b passes within tolerance of every point between"""
+        span = times[b] - times[a]
+        if span <= 0:
+            return False
+        for m in range(a + 1, b):
+            ratio = (times[m] - times[a]) / span
+            for va, vb, vm, tol in zip(values[a], values[b], values[m], tolerance):
+                if abs(va + (vb - va) * ratio - vm) > tol:
+                    return False
+        return True
+
+
+def commands_per_hour(timelines):
+    """Return {mode: light commands per hour} for a {mode: Timeline} dictionary"""
+    report = {}
+    for mode, timeline in timelines.items():
+        hours = (timeline.times[-1] - timeline.times[0]) / 3600
+        report[mode] = round(commands_per_trip_point * (len(timeline) - 1) / hours, 1) if hours > 0 else 0.0
+    return report
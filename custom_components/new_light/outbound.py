@@ -0,0 +1,208 @@
+"""House-wide budget and priority ordering for outbound light commands"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+
+from homeassistant.const import ATTR_ENTITY_ID
+from homeassistant.core import HomeAssistant
+
+from .coalescer import _chain, _freeze, get_coalescer
+from .const import DOMAIN
+
+SWITCH = 0
+MOTION = 1
+TRACKER = 2
+SCHEDULED = 3
+PRIORITY_NAMES = ("switch", "motion", "tracker", "scheduled")
+"""Priority classes, most urgent first"""
+
+COALESCED_PRIORITIES = (TRACKER, SCHEDULED)
+"""Background classes where a newer command for an entity replaces one still waiting"""
+
+DEFAULT_RATE = 15.0
+"""Commands per second the coordinator is trusted with"""
+DEFAULT_BURST = 30
+"""Commands that can go out back to back before pacing starts"""
+
+
+class _Request:
+    __slots__ = ("priority", "args", "kwargs", "key", "entities", "enqueued", "waiters", "observers")
+
+    def __init__(self, priority, args, kwargs, key, entities, enqueued) -> None:
+        self.priority = priority
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.entities = entities
+        self.enqueued = enqueued
+        self.waiters = []
+        self.observers = []
+
+    @property
+    def live(self) -> bool:
+        return any(not fut.done() for fut in self.waiters)
+
+    def resolve(self) -> None:
+        """Release the callers without sending"""
+        for fut in self.waiters:
+            if not fut.done():
+                fut.set_result(None)
+
+
+def _entities(service_data):
+    """The entity ids a command targets, or None if it has none"""
+    if not service_data or ATTR_ENTITY_ID not in service_data:
+        return None
+    ids = service_data[ATTR_ENTITY_ID]
+    return frozenset((ids,) if isinstance(ids, str) else ids)
+
+
+class OutboundScheduler:
+    """Token bucket command budget with one queue per priority class
+
+    Commands go straight out while the budget has tokens and nothing is queued.  Otherwise they wait in their
+    class's queue, and each token is given to the most urgent queue first, so switch presses overtake motion,
+    tracker cascades and RightLight transitions.  A background command for an entity that already has one
+    waiting replaces it, so a starved queue never sends a light through stale steps.  A command also drops any
+    less urgent ones still waiting for the same entities, which would otherwise land after it and undo it.
+    """
+
+    def __init__(self, hass: HomeAssistant, send=None, rate=DEFAULT_RATE, burst=DEFAULT_BURST) -> None:
+        self._hass = hass
+        self._send = send or get_coalescer(hass).async_call
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._stamp = hass.loop.time()
+        self._queues = tuple(deque() for _ in PRIORITY_NAMES)
+        self._waiting = {}
+        """Coalescing key => queued _Request"""
+        self._drain_task = None
+
+        self.coalesced = 0
+        """Number of queued background commands replaced by a newer one"""
+        self.superseded = 0
+        """Number of queued commands dropped for a more urgent one to the same entities"""
+        self._waits = [[0, 0.0, 0.0] for _ in PRIORITY_NAMES]
+        """Per priority [commands sent, total wait, longest wait] in seconds"""
+
+    @property
+    def queued(self) -> int:
+        """Number of commands waiting for budget"""
+        return sum(len(q) for q in self._queues)
+
+    @property
+    def wait_stats(self) -> dict:
+        """{priority name: {count, mean_ms, max_ms}} of time spent queued before sending"""
+        stats = {}
+        for name, (count, total, longest) in zip(PRIORITY_NAMES, self._waits):
+            stats[name] = {
+                "count": count,
+                "mean_ms": round(total / count * 1000, 1) if count else 0.0,
+                "max_ms": round(longest * 1000, 1),
+            }
+        return stats
+
+    async def async_call(
+        self, priority, domain, service, service_data=None, *, observer=None, **kwargs
+    ) -> None:
+        """hass.services.async_call with a priority class in front
+
+        observer, if given, is called with the seconds the command waited for budget once it is sent.
+        """
+        if not self.queued and self._refill() >= 1:
+            self._tokens -= 1
+            self._record(priority, 0.0)
+            if observer is not None:
+                observer(0.0)
+            return await self._send(domain, service, service_data, **kwargs)
+
+        entities = _entities(service_data)
+        if entities:
+            self._supersede(priority, domain, entities)
+
+        key = None
+        if priority in COALESCED_PRIORITIES and not kwargs and entities is not None:
+            key = (priority, domain, _freeze(service_data[ATTR_ENTITY_ID]))
+
+        req = self._waiting.get(key) if key is not None else None
+        if req is not None and req.live:
+            # Newest command wins, keeping its predecessor's place in the queue
+            self.coalesced += 1
+            req.args = (domain, service, service_data)
+        else:
+            req = _Request(
+                priority, (domain, service, service_data), kwargs, key, entities, self._hass.loop.time()
+            )
+            self._queues[priority].append(req)
+            if key is not None:
+                self._waiting[key] = req
+
+        fut = self._hass.loop.create_future()
+        req.waiters.append(fut)
+        if observer is not None:
+            req.observers.append(observer)
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = self._hass.async_create_task(self._drain())
+        await fut
+
+    def _supersede(self, priority, domain, entities) -> None:
+        """Drop less urgent commands still queued for a subset of entities"""
+        for queue in self._queues[priority + 1 :]:
+            for req in queue:
+                if req.entities and req.entities <= entities and req.args[0] == domain and req.live:
+                    self.superseded += 1
+                    if req.key is not None and self._waiting.get(req.key) is req:
+                        del self._waiting[req.key]
+                    req.resolve()
+
+    def _refill(self) -> float:
+        now = self._hass.loop.time()
+        self._tokens = min(self._burst, self._tokens + (now - self._stamp) * self._rate)
+        self._stamp = now
+        return self._tokens
+
+    def _record(self, priority, wait) -> None:
+        stats = self._waits[priority]
+        stats[0] += 1
+        stats[1] += wait
+        stats[2] = max(stats[2], wait)
+
+    def _next(self):
+        for queue in self._queues:
+            while queue:
+                req = queue.popleft()
+                if req.key is not None and self._waiting.get(req.key) is req:
+                    del self._waiting[req.key]
+                # Skip commands whose callers have all given up
+                if req.live:
+                    return req
+        return None
+
+    async def _drain(self) -> None:
+        while self.queued:
+            if self._refill() < 1:
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+                continue
+
+            req = self._next()
+            if req is None:
+                return
+            self._tokens -= 1
+            wait = self._hass.loop.time() - req.enqueued
+            self._record(req.priority, wait)
+            for observer in req.observers:
+                observer(wait)
+
+            task = self._hass.async_create_task(self._send(*req.args, **req.kwargs))
+            for fut in req.waiters:
+                task.add_done_callback(lambda t, fut=fut: _chain(t, fut))
+
+
+def get_outbound_scheduler(hass: HomeAssistant) -> OutboundScheduler:
+    """Return the OutboundScheduler shared by every NewLight"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "outbound" not in data:
+        data["outbound"] = OutboundScheduler(hass)
+    return data["outbound"]
@@ -0,0 +1,337 @@
+"""Replay recorded events through NewLight rooms on a virtual clock
+
+    python -m custom_components.new_light.replay rooms.yaml events.jsonl --days 7
+
+rooms.yaml holds the same rooms list as the light platform (see loader.py).  events.jsonl holds one recorded
+event per line, t being seconds from the start of the replay:
+
+    {"t": 5.2, "type": "mqtt", "topic": "zigbee2mqtt/Kitchen Switch/action", "payload": "on-press"}
+    {"t": 30, "type": "mqtt", "topic": "zigbee2mqtt/Kitchen Motion Sensor", "payload": {"occupancy": true}}
+    {"t": 60, "type": "zha", "data": {"device_ieee": "00:11:22:33:44:55:66:77", "command": "on"}}
+    {"t": 90, "type": "state", "entity_id": "light.hallway", "state": "on", "attributes": {"brightness": 128}}
+
+The rooms are real NewLights running against an in-memory Home Assistant core with no integrations loaded.
+light.turn_on and light.turn_off are answered by a recorder that keeps each light's state, and MQTT subscriptions
+are served by the replay instead of a broker.  The event loop's clock jumps straight to the next timer whenever
+nothing is ready to run, so a week of RightLight steps replays in seconds.
+
+Wall clock readings (RightLight's schedule, trace timestamps) come from a VirtualClock that advances with the
+loop, so days roll over on virtual time too.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+import json
+import tempfile
+import time
+
+import yaml
+
+from homeassistant import core
+from homeassistant.helpers import restore_state
+from homeassistant.util import dt
+
+from .clock import VirtualClock
+from .command_cache import get_command_cache
+from .const import DOMAIN
+from .loader import CONF_ROOMS, ROOM_SCHEMA, build_light
+from .metrics import get_metrics
+from .outbound import get_outbound_scheduler
+from .router import MqttTopicRouter
+
+Message = namedtuple("Message", "topic payload qos")
+"""What MQTT subscribers are handed, with the attributes NewLight reads from a received message"""
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """Event loop whose clock jumps to the next timer whenever nothing is ready to run
+
+    The clock holds still while executor jobs are in flight, so file reads and the like finish at the virtual
+    time they started.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._now = 0.0
+        self._in_executor = 0
+
+        self.timers_scheduled = 0
+        """Number of call_at/call_later timers created"""
+        self.timers_cancelled = 0
+        """Number of timers cancelled before firing"""
+
+    def time(self) -> float:
+        return self._now
+
+    def call_at(self, when, callback, *args, context=None):
+        self.timers_scheduled += 1
+        return super().call_at(when, callback, *args, context=context)
+
+    def _timer_handle_cancelled(self, handle) -> None:
+        self.timers_cancelled += 1
+        super()._timer_handle_cancelled(handle)
+
+    def run_in_executor(self, executor, func, *args):
+        fut = super().run_in_executor(executor, func, *args)
+        self._in_executor += 1
+        fut.add_done_callback(self._executor_done)
+        return fut
+
+    def _executor_done(self, fut) -> None:
+        self._in_executor -= 1
+
+    @property
+    def timers_pending(self) -> int:
+        return sum(1 for handle in self._scheduled if not handle.cancelled())
+
+    def _run_once(self) -> None:
+        # Nothing runnable: skip ahead to the next timer instead of sleeping until it is due
+        if not self._ready and not self._stopping and not self._in_executor and self._scheduled:
+            self._now = max(self._now, self._scheduled[0].when())
+        super()._run_once()
+
+
+class ReplayMqtt:
+    """Stands in for hass.components.mqtt.async_subscribe, delivering replayed messages"""
+
+    def __init__(self, hass) -> None:
+        self._hass = hass
+        self._subs = []
+        """(topic filter, callback)"""
+
+    async def async_subscribe(self, topic, msg_callback, qos=0, encoding="utf-8"):
+        sub = (topic, msg_callback)
+        self._subs.append(sub)
+
+        def unsubscribe() -> None:
+            if sub in self._subs:
+                self._subs.remove(sub)
+
+        return unsubscribe
+
+    def publish(self, topic, payload) -> None:
+        if not isinstance(payload, str):
+            payload = json.dumps(payload)
+        msg = Message(topic, payload, 0)
+        for pattern, msg_callback in list(self._subs):
+            if pattern == topic or (pattern.endswith("#") and topic.startswith(pattern[:-1])):
+                result = msg_callback(msg)
+                if asyncio.iscoroutine(result):
+                    self._hass.async_create_task(result)
+
+
+class CommandRecorder:
+    """Answers light.turn_on/turn_off, keeping each light's state and a log of every command"""
+
+    def __init__(self, hass) -> None:
+        self._hass = hass
+        self.commands = []
+        """(loop time, service, entity_id, service data without entity_id)"""
+        for service in ("turn_on", "turn_off"):
+            hass.services.async_register("light", service, self._handle)
+
+    async def _handle(self, call) -> None:
+        ents = call.data.get("entity_id", [])
+        if isinstance(ents, str):
+            ents = [ents]
+        data = {k: v for k, v in call.data.items() if k != "entity_id"}
+        now = self._hass.loop.time()
+
+        for ent in ents:
+            self.commands.append((now, call.service, ent, data))
+            if call.service == "turn_off":
+                self._hass.states.async_set(ent, "off")
+                continue
+
+            old = self._hass.states.get(ent)
+            attrs = dict(old.attributes) if old is not None and old.state == "on" else {}
+            attrs.update((k, v) for k, v in data.items() if k != "transition")
+            if "kelvin" in attrs:
+                attrs["color_temp_kelvin"] = attrs.pop("kelvin")
+            self._hass.states.async_set(ent, "on", attrs)
+
+
+class ReplayReport:
+    """What a replay sent, how fast, and how many timers it took"""
+
+    def __init__(self, lights, recorder, loop, origin, duration, events, wall) -> None:
+        self.duration = duration
+        """Virtual seconds replayed"""
+        self.wall = wall
+        """Real seconds the replay took"""
+        self.events = events
+        """Number of recorded events fed in"""
+        self.commands = [(t - origin, service, ent, data) for t, service, ent, data in recorder.commands]
+        """(seconds from the start, service, entity_id, service data) of every light command"""
+        self.timers_scheduled = loop.timers_scheduled
+        self.timers_cancelled = loop.timers_cancelled
+        self.timers_pending = loop.timers_pending
+
+        hass = lights[0].hass
+        self.per_light = {light.name: dict(light._metrics.commands) for light in lights}
+        """light name => {source: commands sent}"""
+        self.outbound_wait = get_outbound_scheduler(hass).wait_stats
+        self.cache_hit_rate = get_command_cache(hass).hit_rate
+        self.metrics_text = get_metrics(hass).export_text()
+
+    @property
+    def per_hour(self) -> float:
+        return len(self.commands) / (self.duration / 3600) if self.duration else 0.0
+
+    @property
+    def peak_per_minute(self) -> int:
+        per_minute = Counter(int(t // 60) for t, service, ent, data in self.commands)
+        return max(per_minute.values(), default=0)
+
+    def summary(self) -> str:
+        services = Counter(service for t, service, ent, data in self.commands)
+        lines = [
+            f"replayed {timedelta(seconds=round(self.duration))} in {self.wall:.2f} s "
+            f"({self.duration / max(self.wall, 1e-9):.0f}x)",
+            f"events in: {self.events}",
+            f"commands out: {len(self.commands)} ({self.per_hour:.1f}/h, peak {self.peak_per_minute}/min) "
+            + ", ".join(f"{service} {n}" for service, n in sorted(services.items())),
+            f"timers: {self.timers_scheduled} scheduled, {self.timers_cancelled} cancelled, "
+            f"{self.timers_pending} pending",
+            f"redundant commands skipped: {self.cache_hit_rate:.1%}",
+            "outbound wait: "
+            + ", ".join(f"{name} {s['count']} (max {s['max_ms']} ms)" for name, s in self.outbound_wait.items()),
+        ]
+        for name, sources in self.per_light.items():
+            lines.append(f"  {name}: " + ", ".join(f"{source} {n}" for source, n in sources.items() if n))
+        return "\n".join(lines)
+
+
+def _bare_hass(config_dir, latitude, longitude):
+    """An in-memory Home Assistant core with nothing set up"""
+    try:
+        hass = core.HomeAssistant(config_dir)
+    except TypeError:
+        # Older cores take no arguments
+        hass = core.HomeAssistant()
+        hass.config.config_dir = config_dir
+    hass.config.latitude = latitude
+    hass.config.longitude = longitude
+    return hass
+
+
+def _feed(hass, mqtt, ev) -> None:
+    kind = ev["type"]
+    if kind == "mqtt":
+        mqtt.publish(ev["topic"], ev["payload"])
+    elif kind == "zha":
+        hass.bus.async_fire("zha_event", ev["data"])
+    elif kind == "state":
+        hass.states.async_set(ev["entity_id"], ev["state"], ev.get("attributes"))
+    else:
+        raise ValueError(f"Unknown replay event type {kind}")
+
+
+async def async_replay(rooms, events, start, duration, latitude, longitude, config_dir) -> ReplayReport:
+    """Run validated rooms through events for duration seconds of virtual time from start"""
+    loop = asyncio.get_running_loop()
+    hass = _bare_hass(config_dir, latitude, longitude)
+    if hasattr(restore_state, "async_load"):
+        # Newer cores load the restore state store during bootstrap
+        await restore_state.async_load(hass)
+
+    clock = VirtualClock(loop, start)
+    mqtt = ReplayMqtt(hass)
+    data = hass.data.setdefault(DOMAIN, {})
+    data["clock"] = clock
+    data["mqtt_router"] = MqttTopicRouter(hass, subscribe=mqtt.async_subscribe)
+    recorder = CommandRecorder(hass)
+
+    lights = [build_light(room) for room in rooms]
+    for light in lights:
+        light.hass = hass
+        light.entity_id = light._entity_id
+        for ent in light.entities:
+            if hass.states.get(ent) is None:
+                hass.states.async_set(ent, "off")
+
+    wall = time.monotonic()
+    await asyncio.gather(*(light.async_added_to_hass() for light in lights))
+
+    origin = loop.time()
+    fed = 0
+    for ev in sorted(events, key=lambda ev: ev["t"]):
+        if ev["t"] <= duration:
+            loop.call_at(origin + ev["t"], _feed, hass, mqtt, ev)
+            fed += 1
+    await asyncio.sleep(duration)
+
+    report = ReplayReport(lights, recorder, loop, origin, duration, fed, time.monotonic() - wall)
+    for light in lights:
+        await light.async_will_remove_from_hass()
+        for rl in light.entities.values():
+            if rl is not None:
+                await rl.disable()
+
+    await hass.async_stop(force=True)
+    return report
+
+
+def replay(rooms, events, start, duration, latitude=0.0, longitude=0.0) -> ReplayReport:
+    """Replay on a fresh VirtualEventLoop.  rooms are raw room configurations, events parsed JSON objects"""
+    rooms = [ROOM_SCHEMA(room) for room in rooms]
+    loop = VirtualEventLoop()
+    asyncio.set_event_loop(loop)
+    try:
+        with tempfile.TemporaryDirectory() as config_dir:
+            return loop.run_until_complete(
+                async_replay(rooms, events, start, duration, latitude, longitude, config_dir)
+            )
+    finally:
+        # Let anything still in flight (RightLight steps, coalesced calls) unwind before closing
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rooms", help="YAML file with a rooms list, as for the light platform")
+    parser.add_argument("events", help="JSON lines file of recorded events")
+    parser.add_argument("--start", help="ISO datetime the replay starts at (default: today at midnight)")
+    parser.add_argument("--days", type=float, default=1.0, help="Days of virtual time to run (default: 1)")
+    parser.add_argument("--latitude", type=float, default=0.0)
+    parser.add_argument("--longitude", type=float, default=0.0)
+    parser.add_argument("--time-zone", help="Time zone name for naive start times and RightLight's schedule")
+    parser.add_argument("--commands", help="Write the command stream to this JSON lines file")
+    parser.add_argument("--metrics", help="Write the rooms' metrics to this text file")
+    args = parser.parse_args(argv)
+
+    if args.time_zone:
+        dt.set_default_time_zone(dt.get_time_zone(args.time_zone))
+    start = datetime.fromisoformat(args.start) if args.start else dt.start_of_local_day()
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=dt.DEFAULT_TIME_ZONE)
+
+    with open(args.rooms) as fp:
+        rooms = yaml.safe_load(fp)
+    if isinstance(rooms, dict):
+        rooms = rooms[CONF_ROOMS]
+    with open(args.events) as fp:
+        events = [json.loads(line) for line in fp if line.strip()]
+
+    report = replay(rooms, events, start, args.days * 86400, args.latitude, args.longitude)
+    print(report.summary())
+
+    if args.commands:
+        with open(args.commands, "w") as fp:
+            for t, service, ent, data in report.commands:
+                fp.write(json.dumps({"t": round(t, 3), "service": service, "entity_id": ent, **data}) + "\n")
+    if args.metrics:
+        with open(args.metrics, "w") as fp:
+            fp.write(report.metrics_text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+from homeassistant.helpers import entity
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt
+import logging
+import datetime
+import math
+from collections import deque
+from .ephemeris import get_ephemeris
+from .optimizer import commands_per_hour
+from .scheduler import get_timer_wheel
+from .timeline import TIMELINES
+
+# Number of recent decisions each RightLight keeps, see dumpTrace
+trace_size = 100
+
+class RightLight:
+    """RightLight object to control a single light or light group"""
+
+
+    def __init__(self, ent: entity, hass: HomeAssistant, debug=False, now=None) -> None:
+        self._entity = ent
+        self._hass = hass
+
+        # Function returning the current aware datetime.  Replaceable so schedules can be replayed on virtual time
+        self._nowFunc = now or dt.now
+
+        self._mode = "Off"
+        self.today = None
+
+        self._logger = logging.getLogger(f"RightLight({self._entity})")
+        if debug:
+            self._logger.setLevel(logging.DEBUG)
+
+        # Recent decisions as (timestamp, mode, light values, seconds to the next step), see dumpTrace
+        self._trace = deque(maxlen=trace_size)
+
+        # Mode name => Timeline, shared read-only with every other RightLight
+        self.trip_points = {}
+
+        # Optional ScheduleOptimizer used to thin out trip points, see setScheduleOptimizer
+        self._optimizer = None
+
+        self.on_transition = 0.1
+        self.off_transition = 0.1
+        self.dim_transition = 0.1
+
+        # Pending calls on the shared timer wheel, all cancelled by the next turn_on/disable
+        self._wheel = get_timer_wheel(self._hass)
+        self._currSched = []
+
+        # Bumped by every cancel, so a turn_on still waiting on its first command knows it has been overtaken
+        self._epoch = 0
+
+        cd = self._hass.config.as_dict()
+        self._latitude = cd["latitude"]
+        self._longitude = cd["longitude"]
+
+        # Work out a year of sunrise/sunset times in the background for every RightLight at this location
+        get_ephemeris(self._latitude, self._longitude).warm(self._hass)
+
+        self._getNow()
+
+    async def turn_on(self, **kwargs) -> None:
+        """
+        Turns on a RightLight-controlled entity
+
+        :key brightness: The master brightness control
+        :key brightness_override: Additional brightness to add on to RightLight's calculated brightness
+        :key mode: One of the trip_point key names (Normal, Vivid, Bright, One, Two)
+        :key transition: Seconds to fade to the current values before the transition to the next trip point starts
+        """
+        # Cancel any pending eventloop schedules
+        self._cancelSched()
+        epoch = self._epoch
+
+        self._getNow()
+
+        self._mode = kwargs.get("mode", "Normal")
+        self._brightness = kwargs.get("brightness", 255)
+        self._brightness_override = kwargs.get("brightness_override", 0)
+        transition = kwargs.get("transition", self.on_transition)
+
+        # Find trip points around current time
+        timeline = self.trip_points[self._mode]
+        now_ts = self.now.timestamp()
+        prev, next = timeline.find(now_ts)
+
+        # Calculate how far through the trip point span we are now
+        prev_time = timeline.times[prev]
+        next_time = timeline.times[next]
+        time_ratio = (now_ts - prev_time) / (next_time - prev_time)
+        # Rounded up so the next step never fires before its trip point, and never re-arms for nothing
+        time_rem = max(math.ceil(next_time - now_ts), 1)
+
+        # Lazy %-formatting so nothing is built unless debug logging is on
+        self._logger.debug("Now: %s", self.now)
+        self._logger.debug("Prev/Next: %s, %s, %s, %s, %s", prev, next, prev_time, next_time, time_ratio)
+
+        if self._mode == "Normal":
+            # Blend the two trip points' precomputed values
+            br_now, ct = timeline.blend(prev, next, time_ratio)
+            br = br_now * (self._brightness + self._brightness_override)
+            br_next = timeline.point_br[next] * (self._brightness + self._brightness_override)
+            ct_next = timeline.point_ct[next]
+
+            self._logger.debug("Now/Next: %s/%s, %s/%s", br, ct, br_next, ct_next)
+
+            if br > 255:
+                br = 255
+
+            self._logger.debug("Final: %s/%s -> %ssec", br, ct, time_rem)
+            self._trace.append((now_ts, self._mode, (br, ct), time_rem))
+
+            # Turn on light to interpolated values
+            await self._hass.services.async_call("light", "turn_on", {"entity_id": self._entity, "brightness": br, "kelvin": ct, "transition": transition})
+            if epoch != self._epoch:
+                # Turned off or on again meanwhile, that call owns the schedule now
+                return
+
+            # Transition to next values once the first command has settled, without holding up the caller
+            self._schedule(transition + 1, self._hass.services.async_call, "light", "turn_on", {"entity_id": self._entity, "brightness": br_next, "kelvin": ct_next, "transition": time_rem})
+
+            # Schedule another turn_on at next_time to start the next transition
+            self._schedule(time_rem, self.turn_on, brightness=self._brightness, brightness_override=self._brightness_override)
+
+        else:
+            prev_rgb = timeline.value(prev)
+            next_rgb = timeline.value(next)
+
+            self._logger.debug("Prev/Next: %s/%s", prev_rgb, next_rgb)
+
+            r_now = prev_rgb[0] + (next_rgb[0] - prev_rgb[0])*time_ratio
+            g_now = prev_rgb[1] + (next_rgb[1] - prev_rgb[1])*time_ratio
+            b_now = prev_rgb[2] + (next_rgb[2] - prev_rgb[2])*time_ratio
+
+            self._logger.debug("Final: %s/%s/%s -> %ssec", r_now, g_now, b_now, time_rem)
+            self._trace.append((now_ts, self._mode, (r_now, g_now, b_now), time_rem))
+
+            # Turn on light to interpolated values
+            await self._hass.services.async_call("light", "turn_on", {"entity_id": self._entity, "rgb_color": (r_now, g_now, b_now), "transition": transition})
+            if epoch != self._epoch:
+                # Turned off or on again meanwhile, that call owns the schedule now
+                return
+
+            # Transition to next values once the first command has settled, without holding up the caller
+            self._schedule(transition + 1, self._hass.services.async_call, "light", "turn_on", {"entity_id": self._entity, "rgb_color": next_rgb, "transition": time_rem})
+
+            # Schedule another turn on at next_time to start the next transition
+            self._schedule(time_rem, self.turn_on, mode=self._mode)
+
+    async def turn_on_specific(self, data):
+        """Stop following the trip points and turn on with specific service data (a color, color temperature...)"""
+        # Cancel any pending eventloop schedules
+        self._cancelSched()
+
+        self._trace.append((self._nowFunc().timestamp(), "Specific", data, None))
+        await self._hass.services.async_call("light", "turn_on", dict(data, entity_id=self._entity))
+
+    async def disable_and_turn_off(self, **kwargs):
+        # Cancel any pending eventloop schedules
+        self._cancelSched()
+
+        self._brightness = 0
+        self._trace.append((self._nowFunc().timestamp(), "Off", None, None))
+        await self._hass.services.async_call("light", "turn_off", {"entity_id": self._entity, "transition": kwargs.get("transition", self.off_transition)})
+
+    async def disable(self):
+        # Cancel any pending eventloop schedules
+        self._cancelSched()
+
+    def getColorModes(self):
+        """Return the names of the color modes, every mode but Normal"""
+        return [mode for mode in self.trip_points if mode != "Normal"]
+
+    def _cancelSched(self):
+        self._epoch += 1
+        for ret in self._currSched:
+            ret.cancel()
+        self._currSched.clear()
+
+    def _schedule(self, delay, func, *args, **kwargs):
+        """Run coroutine function func after delay seconds.  Cancelled by the next turn_on/disable"""
+        # Only create the coroutine when the timer fires so a cancelled schedule leaves nothing un-awaited
+        self._currSched.append(self._wheel.schedule(delay, func, *args, **kwargs))
+
+    def _getNow(self):
+        self.now = self._nowFunc()
+        rerun = (self.now.date() != self.today)
+        self.today = self.now.date()
+
+        if rerun:
+            self.defineTripPoints()
+
+    def defineTripPoints(self):
+        """Fetch today's trip points from the shared timeline store"""
+        self.trip_points = TIMELINES.get(self.now, self._latitude, self._longitude, self._optimizer)
+
+    def setScheduleOptimizer(self, optimizer):
+        """Use a ScheduleOptimizer (or None for every trip point) from the next turn_on"""
+        self._optimizer = optimizer
+        self.defineTripPoints()
+
+    def dumpTrace(self):
+        """Return the recent decisions, oldest first, one line each"""
+        lines = []
+        for ts, mode, values, time_rem in self._trace:
+            line = f"{datetime.datetime.fromtimestamp(ts)} {self._entity} {mode}"
+            if values is not None:
+                line += f" {values}"
+            if time_rem is not None:
+                line += f" -> {time_rem}sec"
+            lines.append(line)
+        return lines
+
+    def commandsPerHour(self):
+        """Return {mode: light commands per hour} for the trip points in use"""
+        return commands_per_hour(self.trip_points)
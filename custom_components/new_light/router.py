@@ -0,0 +1,134 @@
+"""Route zha_event bus events and zigbee2mqtt messages to the lights that use them"""
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ZhaEventRouter:
+    """Single zha_event listener dispatching on device IEEE address
+
+    Each button press is looked up once in a dictionary instead of waking every light's own listener to compare
+    addresses.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._routes = {}
+        """device_ieee => list of async handlers"""
+        self._unsub = None
+
+        self.routed = 0
+        """Number of events delivered to at least one light"""
+        self.unmatched = 0
+        """Number of events for devices no light registered"""
+
+    @callback
+    def register(self, ieee, handler):
+        """Send zha_events from device ieee to handler(event).  Returns an unregister function"""
+        self._routes.setdefault(ieee, []).append(handler)
+        if self._unsub is None:
+            self._unsub = self._hass.bus.async_listen("zha_event", self._handle)
+
+        @callback
+        def unregister() -> None:
+            handlers = self._routes.get(ieee, [])
+            if handler in handlers:
+                handlers.remove(handler)
+            if not handlers:
+                self._routes.pop(ieee, None)
+            if not self._routes and self._unsub is not None:
+                self._unsub()
+                self._unsub = None
+
+        return unregister
+
+    @callback
+    def _handle(self, ev) -> None:
+        handlers = self._routes.get(ev.data.get("device_ieee"))
+        if not handlers:
+            self.unmatched += 1
+            return
+
+        self.routed += 1
+        for handler in handlers:
+            self._hass.async_create_task(handler(ev))
+
+
+class MqttTopicRouter:
+    """One wildcard subscription under a base topic, dispatching messages on their exact topic
+
+    Lights register the topics they care about in an in-process table, so a house with many switches and motion
+    sensors holds a single broker subscription, and only the first registration waits on the broker.  The
+    subscribe function can be swapped for a local stand-in of hass.components.mqtt.async_subscribe.
+    """
+
+    def __init__(self, hass: HomeAssistant, subscribe=None, base="zigbee2mqtt") -> None:
+        self._hass = hass
+        self._subscribe = subscribe or hass.components.mqtt.async_subscribe
+        self._base = base
+        self._routes = {}
+        """topic => list of async handlers"""
+        self._unsub = None
+        self._lock = asyncio.Lock()
+
+        self.routed = 0
+        """Number of messages delivered to at least one light"""
+        self.unmatched = 0
+        """Number of messages on topics no light registered"""
+
+    async def async_register(self, topic, handler):
+        """Send messages on topic to handler(msg).  Returns an unregister function"""
+        if not topic.startswith(f"{self._base}/"):
+            raise ValueError(f"{topic} is not under {self._base}/")
+
+        self._routes.setdefault(topic, []).append(handler)
+        async with self._lock:
+            if self._unsub is None:
+                self._unsub = await self._subscribe(f"{self._base}/#", self._handle)
+
+        @callback
+        def unregister() -> None:
+            handlers = self._routes.get(topic, [])
+            if handler in handlers:
+                handlers.remove(handler)
+            if not handlers:
+                self._routes.pop(topic, None)
+            if not self._routes and self._unsub is not None:
+                self._unsub()
+                self._unsub = None
+
+        return unregister
+
+    @callback
+    def _handle(self, msg) -> None:
+        handlers = self._routes.get(msg.topic)
+        if not handlers:
+            self.unmatched += 1
+            return
+
+        self.routed += 1
+        for handler in handlers:
+            self._hass.async_create_task(handler(msg))
+
+
+def get_zha_router(hass: HomeAssistant) -> ZhaEventRouter:
+    """Return the ZhaEventRouter shared by every NewLight"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "zha_router" not in data:
+        data["zha_router"] = ZhaEventRouter(hass)
+    return data["zha_router"]
+
+
+def get_mqtt_router(hass: HomeAssistant) -> MqttTopicRouter:
+    """Return the zigbee2mqtt MqttTopicRouter shared by every NewLight"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "mqtt_router" not in data:
+        data["mqtt_router"] = MqttTopicRouter(hass)
+    return data["mqtt_router"]
@@ -0,0 +1,138 @@
+"""Single timer wheel shared by every RightLight schedule"""
+import contextvars
+import heapq
+import math
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DOMAIN
+
+# Width of a wheel slot in seconds.  Everything due within the same slot fires in one wakeup
+resolution = 1.0
+
+
+class ScheduledCall:
+    """Handle for one pending call on the TimerWheel"""
+
+    __slots__ = ("_wheel", "_slot", "func", "args", "kwargs")
+
+    def __init__(self, wheel, slot, func, args, kwargs) -> None:
+        self._wheel = wheel
+        self._slot = slot
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    @property
+    def pending(self) -> bool:
+        return self._slot is not None
+
+    def cancel(self) -> None:
+        """Cancel the call if it hasn't run yet"""
+        if self._slot is not None:
+            self._wheel._remove(self)
+
+
+class TimerWheel:
+    """Group RightLight wakeups into one event loop timer
+
+    Calls are filed into slots of 'resolution' seconds, rounded up so nothing runs early.  Lights stepping to
+    the same trip point land in the same slot and run from one wakeup, and only the earliest slot holds an
+    event loop timer.  Every pending call is tracked, so they can be counted and cancelled together.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._slots = {}
+        """slot => list of ScheduledCalls due in it"""
+        self._heap = []
+        """Slot numbers with pending calls, earliest first"""
+        self._timer = None
+        self._timer_slot = None
+
+        self.wakeups = 0
+        """Number of times the wheel has fired"""
+        self.fired = 0
+        """Number of calls run"""
+
+    @property
+    def active(self) -> int:
+        """Number of calls waiting to run"""
+        return sum(len(calls) for calls in self._slots.values())
+
+    def schedule(self, delay, func, *args, **kwargs) -> ScheduledCall:
+        """Run coroutine function func(*args, **kwargs) after at least delay seconds"""
+        slot = math.ceil((self._hass.loop.time() + delay) / resolution)
+        call = ScheduledCall(self, slot, func, args, kwargs)
+
+        calls = self._slots.get(slot)
+        if calls is None:
+            calls = self._slots[slot] = []
+            heapq.heappush(self._heap, slot)
+        calls.append(call)
+
+        if self._timer_slot is None or slot < self._timer_slot:
+            self._arm(slot)
+        return call
+
+    def cancel_all(self) -> None:
+        """Cancel every pending call"""
+        for calls in self._slots.values():
+            for call in calls:
+                call._slot = None
+        self._slots.clear()
+        self._heap.clear()
+        self._arm(None)
+
+    def _remove(self, call) -> None:
+        calls = self._slots.get(call._slot)
+        if calls is not None and call in calls:
+            calls.remove(call)
+            if not calls:
+                # Left in the heap and skipped when reached
+                del self._slots[call._slot]
+        call._slot = None
+
+    def _arm(self, slot) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._timer_slot = slot
+        if slot is not None:
+            # Fire in a fresh context, so steps don't inherit whatever command armed the timer
+            self._timer = self._hass.loop.call_at(slot * resolution, self._fire, context=contextvars.Context())
+
+    @callback
+    def _fire(self) -> None:
+        due = self._timer_slot
+        self._timer = None
+        self._timer_slot = None
+        self.wakeups += 1
+
+        while self._heap and self._heap[0] <= due:
+            for call in self._slots.pop(heapq.heappop(self._heap), []):
+                call._slot = None
+                self.fired += 1
+                self._hass.async_create_task(call.func(*call.args, **call.kwargs))
+
+        # Drop slots emptied by cancellation, then wait for the next one
+        while self._heap and self._heap[0] not in self._slots:
+            heapq.heappop(self._heap)
+        if self._heap:
+            self._arm(self._heap[0])
+
+
+def get_timer_wheel(hass: HomeAssistant) -> TimerWheel:
+    """Return the TimerWheel shared by every RightLight"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "timer_wheel" not in data:
+        wheel = data["timer_wheel"] = TimerWheel(hass)
+
+        # Cancel every pending RightLight step on shutdown
+        @callback
+        def cancel_schedules(event) -> None:
+            wheel.cancel_all()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, cancel_schedules)
+    return data["timer_wheel"]
@@ -0,0 +1,132 @@
+"""Diagnostic sensors exposing each NewLight's metrics and the house-wide command counters, plus the
+export_metrics and dump_trace services
+
+Loaded by the new_light integration's async_setup, which Home Assistant runs for the new_light light platform
+and for any integration listing new_light in its manifest dependencies.
+"""
+from __future__ import annotations
+
+from datetime import timedelta
+import logging
+
+import voluptuous as vol
+
+from homeassistant.components.sensor import SensorEntity
+from homeassistant.const import EntityCategory
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
+
+from .coalescer import get_coalescer
+from .command_cache import get_command_cache
+from .const import DOMAIN
+from .metrics import get_metrics
+from .outbound import get_outbound_scheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+SCAN_INTERVAL = timedelta(seconds=60)
+"""Metrics are only read this often, recording them never touches the state machine"""
+
+EXPORT_FILE = "new_light_metrics.txt"
+TRACE_FILE = "new_light_trace.txt"
+
+DUMP_TRACE_SCHEMA = vol.Schema({vol.Optional("name"): cv.string})
+
+
+async def async_setup_platform(
+    hass: HomeAssistant,
+    config: ConfigType,
+    add_entities: AddEntitiesCallback,
+    discovery_info: DiscoveryInfoType | None = None,
+) -> None:
+    """Add a metrics sensor for every NewLight, now and as they are set up, and one for the whole house"""
+    registry = get_metrics(hass)
+    add_entities([HouseMetricsSensor(hass)])
+
+    @callback
+    def add_sensors(lights) -> None:
+        add_entities([MetricsSensor(metrics) for metrics in lights])
+
+    registry.set_listener(add_sensors)
+
+    async def export_metrics(call: ServiceCall) -> None:
+        """Write every light's metrics to a text file in the config directory"""
+        path = hass.config.path(EXPORT_FILE)
+        text = registry.export_text()
+        await hass.async_add_executor_job(_write, path, text)
+        _LOGGER.info("new_light metrics written to %s", path)
+
+    hass.services.async_register(DOMAIN, "export_metrics", export_metrics)
+
+    async def dump_trace(call: ServiceCall) -> None:
+        """Write the recent decisions of one light (by name) or all lights to a text file in the config directory"""
+        name = call.data.get("name")
+        if name is not None and name not in registry.lights:
+            _LOGGER.error("new_light dump_trace: unknown light %s", name)
+            return
+        path = hass.config.path(TRACE_FILE)
+        text = registry.dump_trace(name)
+        await hass.async_add_executor_job(_write, path, text)
+        _LOGGER.info("new_light trace written to %s", path)
+
+    hass.services.async_register(DOMAIN, "dump_trace", dump_trace, schema=DUMP_TRACE_SCHEMA)
+
+
+def _write(path, text) -> None:
+    with open(path, "w") as fp:
+        fp.write(text)
+
+
+class MetricsSensor(SensorEntity):
+    """Commands sent by one light, with its latency histograms as attributes"""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_native_unit_of_measurement = "commands"
+
+    def __init__(self, metrics) -> None:
+        self._metrics = metrics
+        self._attr_name = f"{metrics.name} Metrics"
+        self._attr_unique_id = f"{DOMAIN}_metrics_{metrics.name}"
+
+    @property
+    def native_value(self) -> int:
+        return sum(self._metrics.commands.values())
+
+    @property
+    def extra_state_attributes(self):
+        return self._metrics.snapshot()
+
+
+class HouseMetricsSensor(SensorEntity):
+    """Service calls sent on behalf of every light, with the coalescer, outbound queue and command cache counters
+    shared by all of them as attributes"""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_native_unit_of_measurement = "calls"
+    _attr_name = "New Light Metrics"
+    _attr_unique_id = f"{DOMAIN}_metrics"
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._coalescer = get_coalescer(hass)
+        self._outbound = get_outbound_scheduler(hass)
+        self._command_cache = get_command_cache(hass)
+
+    @property
+    def native_value(self) -> int:
+        return self._coalescer.sent
+
+    @property
+    def extra_state_attributes(self):
+        return {
+            "service_calls_requested": self._coalescer.requested,
+            "service_calls_sent": self._coalescer.sent,
+            "service_call_merge_ratio": round(self._coalescer.merge_ratio, 2),
+            "outbound_queued": self._outbound.queued,
+            "outbound_coalesced": self._outbound.coalesced,
+            "outbound_superseded": self._outbound.superseded,
+            "outbound_wait": self._outbound.wait_stats,
+            "redundant_commands_skipped": self._command_cache.hits,
+            "redundant_command_rate": round(self._command_cache.hit_rate, 2),
+        }
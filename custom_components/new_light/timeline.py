@@ -0,0 +1,183 @@
+"""Shared, read-only RightLight trip point timelines"""
+from array import array
+from bisect import bisect_right
+from datetime import timedelta
+
+from .ephemeris import get_ephemeris
+
+# Color cycles for the RightLight color modes
+vivid_trip_points = (
+    (255,   0,   0),
+    (202,   0, 127),
+    (130,   0, 255),
+    (  0,   0, 255),
+    (  0,  90, 190),
+    (  0, 200, 200),
+    (  0, 255,   0),
+    (255, 255,   0),
+    (255, 127,   0),
+)
+
+bright_trip_points = (
+    (255, 100, 100),
+    (202,  80, 127),
+    (150,  70, 255),
+    ( 90,  90, 255),
+    ( 60, 100, 190),
+    ( 70, 200, 200),
+    ( 80, 255,  80),
+    (255, 255,   0),
+    (255, 127,  70),
+)
+
+one_trip_points = (
+    (  0, 104, 255),
+    (255,   0, 255),
+)
+
+two_trip_points = (
+    (255,   0, 255),
+    (  0, 104, 255),
+)
+
+color_modes = {
+    "Vivid": vivid_trip_points,
+    "Bright": bright_trip_points,
+    "One": one_trip_points,
+    "Two": two_trip_points,
+}
+
+# Time between color mode trip points
+timestep = timedelta(minutes=2)
+
+# Normal mode color temperature is pulled towards ct_high as brightness drops
+ct_high = 5000
+ct_scalar = 0.35
+
+
+class Timeline:
+    """Immutable trip point timeline for one mode over one day
+
+    Timestamps are kept as epoch seconds in a flat array.  Values are stored once in a palette and each trip
+    point holds a one-byte index into it, so a 720 point color cycle costs a few kilobytes in total.
+    """
+
+    __slots__ = ("times", "palette", "_index")
+
+    def __init__(self, times, palette, index) -> None:
+        self.times = array("d", times)
+        self.palette = tuple(palette)
+        self._index = array("B" if len(self.palette) <= 256 else "H", index)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def value(self, i):
+        """Return the value of trip point i (an (ct, br) pair for Normal, an rgb tuple otherwise)"""
+        return self.palette[self._index[i]]
+
+    def find(self, ts):
+        """Return the (prev, next) trip point indices bracketing timestamp ts"""
+        # First trip point after ts, clamped to the last point of the day.  At a trip point exactly the span
+        # starting there is the current one, otherwise a step fired on time would re-arm for zero seconds
+        next = min(bisect_right(self.times, ts), len(self.times) - 1)
+        return next - 1, next
+
+
+class NormalTimeline(Timeline):
+    """Normal mode timeline with each trip point's brightness and kelvin worked out once
+
+    Brightness is stored normalized to 0-1, so a light's target is a blend of the two trip points around it times
+    its own brightness and override.
+    """
+
+    __slots__ = ("point_br", "point_ct")
+
+    def __init__(self, times, palette, index) -> None:
+        super().__init__(times, palette, index)
+
+        # Normalized brightness and kelvin at each trip point
+        self.point_br = array("d")
+        self.point_ct = array("d")
+        for i in range(len(self)):
+            ct_max, br_max = self.value(i)
+            br_max = br_max / 255
+            self.point_br.append(br_max)
+            self.point_ct.append(ct_max - (ct_high - ct_max) * (1 - br_max) * ct_scalar)
+
+    def blend(self, prev, next, ratio):
+        """Return (normalized brightness, kelvin) ratio of the way from trip point prev to next"""
+        br = self.point_br[prev] + (self.point_br[next] - self.point_br[prev]) * ratio
+        ct = self.point_ct[prev] + (self.point_ct[next] - self.point_ct[prev]) * ratio
+        return br, ct
+
+
+class TimelineStore:
+    """Process-wide cache of each day's timelines, keyed by (date, latitude, longitude, optimizer)"""
+
+    def __init__(self) -> None:
+        self._timelines = {}
+
+    def get(self, now, latitude, longitude, optimizer=None):
+        """Return the {mode: Timeline} dictionary for the day containing 'now'
+
+        With an optimizer the simplified timelines are returned, cached alongside the full ones.
+        """
+        key = (now.date(), latitude, longitude, optimizer)
+        timelines = self._timelines.get(key)
+        if timelines is None:
+            if optimizer is None:
+                timelines = self._build(now, latitude, longitude)
+            else:
+                timelines = optimizer.apply(self.get(now, latitude, longitude))
+
+            # Only today's timelines are needed, drop anything older
+            for old in [k for k in self._timelines if k[0] < key[0]]:
+                del self._timelines[old]
+            self._timelines[key] = timelines
+
+        return timelines
+
+    def _build(self, now, latitude, longitude):
+        sunrise, sunset = get_ephemeris(latitude, longitude).get(now.date())
+        midnight_early = now.replace(microsecond=0, second=0, minute=0, hour=0)
+        midnight_next  = midnight_early + timedelta(days=1)
+
+        normal = [
+            [midnight_early, 2500, 150],  # Midnight morning
+            [sunrise - timedelta(minutes=60), 2500, 120],  # Sunrise - 60
+            [sunrise - timedelta(minutes=30), 2700, 170],  # Sunrise - 30
+            [sunrise, 3200, 155],  # Sunrise
+            [sunrise + timedelta(minutes=30), 4700, 255],  # Sunrise + 30
+            [sunset - timedelta(minutes=90), 4200, 255],  # Sunset - 90
+            [sunset - timedelta(minutes=30), 3200, 255],  # Sunset - 30
+            [sunset, 2700, 255],  # Sunset
+            [now.replace(microsecond=0, second=0, minute=30, hour=22), 2500, 255],  # 10:30
+            [midnight_next, 2500, 150],  # Midnight night
+        ]
+
+        timelines = {}
+        timelines["Normal"] = NormalTimeline(
+            [tp[0].timestamp() for tp in normal],
+            [(tp[1], tp[2]) for tp in normal],
+            range(len(normal)),
+        )
+
+        # Color modes share one set of timestamps, every 'timestep' from midnight to midnight.  Both ends are
+        # included so every moment of the day has a trip point after it
+        times = []
+        temp = midnight_early
+        while temp <= midnight_next:
+            times.append(temp.timestamp())
+            temp = temp + timestep
+
+        for mode, palette in color_modes.items():
+            timelines[mode] = Timeline(
+                times, palette, [i % len(palette) for i in range(len(times))]
+            )
+
+        return timelines
+
+
+TIMELINES = TimelineStore()
+"""Timelines shared by every RightLight in this process"""
@@ -0,0 +1,50 @@
+"""Fixed-size per-light trace of recent decisions"""
+from __future__ import annotations
+
+from collections import deque
+from datetime import datetime
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+TRACE_SIZE = 200
+"""Records kept per light"""
+
+
+class Trace:
+    """Ring buffer of (time, kind, fields) records
+
+    Recording appends a tuple; nothing is formatted until the trace is dumped.  Records are also logged at
+    debug level on this module's logger, so turning that on streams every light's decisions as they happen.
+    """
+
+    __slots__ = ("name", "_records", "_time")
+
+    def __init__(self, name, size=TRACE_SIZE, clock=time.time) -> None:
+        self.name = name
+        self._records = deque(maxlen=size)
+        self._time = clock
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def record(self, kind, **fields) -> None:
+        self._records.append((self._time(), kind, fields))
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("%s %s %s", self.name, kind, fields)
+
+    def entries(self) -> list[tuple[float, str]]:
+        """Return (time, formatted line) for each record, oldest first"""
+        return [
+            (
+                ts,
+                f"{datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} {self.name} {kind} "
+                + " ".join(f"{key}={value}" for key, value in fields.items()),
+            )
+            for ts, kind, fields in self._records
+        ]
+
+    def dump(self) -> list[str]:
+        """Return the records oldest first, one formatted line each"""
+        return [line for ts, line in self.entries()]
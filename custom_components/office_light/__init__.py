@@ -11,6 +11,6 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Your controller/hub specific code."""
     #hass.states.async_set("new_light.fake_office_light", "pre_init")
     #hass.data[DOMAIN] = {"temperature": 23}
-    hass.helpers.discovery.load_platform("light", DOMAIN, {}, config)
+    hass.helpers.discovery.load_platform("light", DOMAIN, config.get(DOMAIN) or {}, config)
 
     return True
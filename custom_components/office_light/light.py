@@ -1,14 +1,16 @@
 """Platform for light integration"""
 from __future__ import annotations
-import logging, json
+import asyncio, logging, json
 from enum import Enum
 import homeassistant.helpers.config_validation as cv
 from homeassistant.components.light import ATTR_BRIGHTNESS, LightEntity
-from homeassistant.core import HomeAssistant, callback
+from homeassistant.core import HomeAssistant, ServiceCall, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 from homeassistant.helpers import event
-from .right_light import RightLight
+from ..new_light.loader import OPTIMIZER_SCHEMA
+from ..new_light.right_light import RightLight
+from ..new_light.scheduler import get_timer_wheel
 
 #TODO: Return supported features
 
@@ -18,6 +20,7 @@ _LOGGER = logging.getLogger(__name__)
 
 light_entity = "light.office_group"
 brightness_step = 32
+trace_file = "office_light_trace.txt"
 
 async def async_setup_platform(
     hass: HomeAssistant,
@@ -29,7 +32,13 @@ async def async_setup_platform(
     # We only want this platform to be set up via discovery.
     if discovery_info is None:
         return
-    ent = OfficeLight()
+
+    # Trip point thinning is opt-in, configured as office_light: schedule_optimizer: {rgb_tolerance: 10, ...}
+    optimizer = None
+    if "schedule_optimizer" in discovery_info:
+        optimizer = OPTIMIZER_SCHEMA(discovery_info["schedule_optimizer"])
+
+    ent = OfficeLight(optimizer)
     add_entities([ent])
 
     @callback
@@ -42,8 +51,25 @@ async def async_setup_platform(
         """A new motion sensor MQTT message has been received"""
         await ent.motion_sensor_message_received(topic, json.loads(payload), qos)
 
-    await hass.components.mqtt.async_subscribe( "zigbee2mqtt/Office Switch/action", switch_message_received )
-    await hass.components.mqtt.async_subscribe( "zigbee2mqtt/Theater Motion Sensor", motion_sensor_message_received )
+    # Subscribe to both topics at once rather than waiting on the broker for each in turn
+    await asyncio.gather(
+        hass.components.mqtt.async_subscribe( "zigbee2mqtt/Office Switch/action", switch_message_received ),
+        hass.components.mqtt.async_subscribe( "zigbee2mqtt/Theater Motion Sensor", motion_sensor_message_received ),
+    )
+
+    async def dump_trace(call: ServiceCall) -> None:
+        """Write the RightLight's recent decisions to a text file in the config directory"""
+        path = hass.config.path(trace_file)
+        text = "".join(f"{line}\n" for line in ent._rightlight.dumpTrace())
+        await hass.async_add_executor_job(_writeFile, path, text)
+        _LOGGER.info("office_light trace written to %s", path)
+
+    hass.services.async_register(DOMAIN, "dump_trace", dump_trace)
+
+
+def _writeFile(path, text) -> None:
+    with open(path, "w") as fp:
+        fp.write(text)
 
 
 class Modes(Enum):
@@ -56,9 +82,10 @@ class Modes(Enum):
 class OfficeLight(LightEntity):
     """Office Light."""
 
-    def __init__(self) -> None:
+    def __init__(self, optimizer=None) -> None:
         """Initialize Office Light."""
         self._light = light_entity
+        self._optimizer = optimizer
         self._name = "Office"
         self._state = 'off'
         self._brightness = 0
@@ -77,6 +104,8 @@ class OfficeLight(LightEntity):
     async def async_added_to_hass(self) -> None:
         """Instantiate RightLight"""
         self._rightlight = RightLight(self._light, self.hass)
+        if self._optimizer is not None:
+            self._rightlight.setScheduleOptimizer(self._optimizer)
 
 #        #temp = self.hass.states.get(harmony_entity).new_state
 #        #_LOGGER.error(f"Harmony state: {temp}")
@@ -104,7 +133,7 @@ class OfficeLight(LightEntity):
 
     def _updateState(self, comment = ""):
 #        self.hass.states.async_set(f"light.{self._name}", self._state, {"brightness": self._brightness, "brightness_override": self._brightness_override, "switched_on": self.switched_on, "harmony_on": self.harmony_on, "mode": self._mode, "comment": comment})
-        self.hass.states.async_set(f"light.{self._name}", self._state, {"brightness": self._brightness, "brightness_override": self._brightness_override, "switched_on": self.switched_on, "mode": self._mode, "comment": comment})
+        self.hass.states.async_set(f"light.{self._name}", self._state, {"brightness": self._brightness, "brightness_override": self._brightness_override, "switched_on": self.switched_on, "mode": self._mode, "comment": comment, "active_schedules": get_timer_wheel(self.hass).active, "commands_per_hour": self._rightlight.commandsPerHour()})
 
     @property
     def should_poll(self):
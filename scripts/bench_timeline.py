@@ -0,0 +1,55 @@
+"""Benchmark RightLight's trip point lookup: a linear scan against Timeline.find's bisect
+
+Looks up the current span at every 2-minute tick of a day, for every light and mode, the way each turn_on and
+scheduled step does.  Both methods must agree on every tick.  Needs the packages in requirements_test.txt.
+
+    python scripts/bench_timeline.py [lights]
+"""
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from custom_components.new_light.timeline import TimelineStore  # noqa: E402
+
+MODES = ("Normal", "Vivid")
+
+
+def linear(timeline, ts):
+    """The lookup Timeline.find replaced: walk the trip points until one is after ts"""
+    times = timeline.times
+    for next in range(len(times)):
+        if times[next] > ts:
+            break
+    return next - 1, next
+
+
+def bench(lights, timelines, ticks, find) -> float:
+    start = time.perf_counter()
+    for mode in MODES:
+        timeline = timelines[mode]
+        for ts in ticks:
+            for _ in range(lights):
+                find(timeline, ts)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    lights = int(sys.argv[1]) if len(sys.argv) > 1 else 48
+    midnight = datetime(2024, 6, 21, tzinfo=timezone.utc)
+    timelines = TimelineStore().get(midnight, 45.0, -93.0)
+    ticks = [(midnight + timedelta(minutes=2 * i, seconds=1)).timestamp() for i in range(720)]
+
+    for mode in MODES:
+        for ts in ticks + [midnight.timestamp()]:
+            assert linear(timelines[mode], ts) == timelines[mode].find(ts), (mode, ts)
+
+    print(f"{lights} lights, {len(ticks)} ticks, modes {', '.join(MODES)}")
+    print(f"linear scan {bench(lights, timelines, ticks, linear):.2f} s")
+    print(f"bisect      {bench(lights, timelines, ticks, lambda tl, ts: tl.find(ts)):.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Tests for the service call coalescer"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.new_light.coalescer import ServiceCallCoalescer
+
+
+class FakeServices:
+    """Records hass.services.async_call"""
+
+    def __init__(self, error=None) -> None:
+        self.calls = []
+        self.error = error
+
+    async def async_call(self, domain, service, service_data=None, **kwargs):
+        self.calls.append((domain, service, service_data, kwargs))
+        if self.error is not None:
+            raise self.error
+
+
+def _hass(loop, services):
+    return SimpleNamespace(loop=loop, services=services, async_create_task=loop.create_task)
+
+
+def test_merges_identical_payloads_in_one_tick():
+    async def run():
+        services = FakeServices()
+        coalescer = ServiceCallCoalescer(_hass(asyncio.get_running_loop(), services))
+
+        await asyncio.gather(
+            coalescer.async_call("light", "turn_on", {"entity_id": "light.a", "brightness": 100}),
+            coalescer.async_call("light", "turn_on", {"entity_id": "light.b", "brightness": 100}),
+            coalescer.async_call("light", "turn_on", {"entity_id": "light.c", "brightness": 50}),
+        )
+
+        assert sorted(call[2]["brightness"] for call in services.calls) == [50, 100]
+        merged = next(call for call in services.calls if call[2]["brightness"] == 100)
+        assert merged[2]["entity_id"] == ["light.a", "light.b"]
+        assert coalescer.requested == 3
+        assert coalescer.sent == 2
+
+    asyncio.run(run())
+
+
+def test_calls_with_keyword_arguments_go_straight_out():
+    async def run():
+        services = FakeServices()
+        coalescer = ServiceCallCoalescer(_hass(asyncio.get_running_loop(), services))
+
+        await asyncio.gather(
+            coalescer.async_call("light", "turn_off", {"entity_id": "light.a"}, blocking=True),
+            coalescer.async_call("light", "turn_off", {"entity_id": "light.b"}, blocking=True),
+        )
+
+        assert len(services.calls) == 2
+        assert all(call[3] == {"blocking": True} for call in services.calls)
+
+    asyncio.run(run())
+
+
+def test_error_reaches_every_merged_caller():
+    async def run():
+        services = FakeServices(error=RuntimeError("zigbee2mqtt offline"))
+        coalescer = ServiceCallCoalescer(_hass(asyncio.get_running_loop(), services))
+
+        results = await asyncio.gather(
+            coalescer.async_call("light", "turn_off", {"entity_id": "light.a"}),
+            coalescer.async_call("light", "turn_off", {"entity_id": "light.b"}),
+            return_exceptions=True,
+        )
+
+        assert len(services.calls) == 1
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    asyncio.run(run())
@@ -0,0 +1,68 @@
+"""Tests for the last commanded state cache"""
+from types import SimpleNamespace
+
+from custom_components.new_light.command_cache import MAX_AGE, TRANSITION_SLACK, CommandCache
+
+
+class FakeHass:
+    """Just enough hass for CommandCache: a settable loop clock and entity states"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.loop = SimpleNamespace(time=lambda: self.now)
+        self.entity_states = {}
+        self.states = SimpleNamespace(get=self.entity_states.get)
+
+
+def _on(**data):
+    return {"entity_id": "light.a", **data}
+
+
+def test_repeat_after_transition_is_skipped():
+    hass = FakeHass()
+    cache = CommandCache(hass)
+    hass.entity_states["light.a"] = SimpleNamespace(state="on", attributes={})
+
+    assert not cache.check("light", "turn_on", _on(brightness=100, kelvin=3000, transition=3600))
+    hass.now = 3600 - TRANSITION_SLACK
+    assert cache.check("light", "turn_on", _on(brightness=101, kelvin=3005, transition=1800))
+    assert cache.hits == 1
+    assert cache.lookups == 2
+
+
+def test_repeat_during_transition_is_sent():
+    hass = FakeHass()
+    cache = CommandCache(hass)
+
+    assert not cache.check("light", "turn_on", _on(brightness=100, transition=3600))
+    hass.now = 1800
+    assert not cache.check("light", "turn_on", _on(brightness=100, transition=3600))
+
+
+def test_entry_expires_max_age_after_transition_end():
+    hass = FakeHass()
+    cache = CommandCache(hass)
+
+    assert not cache.check("light", "turn_on", _on(brightness=100, transition=60))
+    hass.now = 60 + MAX_AGE + 1
+    assert not cache.check("light", "turn_on", _on(brightness=100))
+
+
+def test_light_switched_elsewhere_is_sent():
+    hass = FakeHass()
+    cache = CommandCache(hass)
+
+    assert not cache.check("light", "turn_off", _on())
+    hass.entity_states["light.a"] = SimpleNamespace(state="on", attributes={})
+    assert not cache.check("light", "turn_off", _on())
+
+
+def test_seeded_state_matches_subset_of_attributes():
+    hass = FakeHass()
+    cache = CommandCache(hass)
+    state = SimpleNamespace(state="on", attributes={"brightness": 100, "color_temp_kelvin": 3000})
+    cache.seed("light.a", state)
+    hass.entity_states["light.a"] = state
+
+    assert cache.check("light", "turn_on", _on(brightness=100))
+    assert not cache.check("light", "turn_on", _on(brightness=100, rgb_color=(255, 0, 0)))
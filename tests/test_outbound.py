@@ -0,0 +1,69 @@
+"""Tests for the outbound command budget and priority queues"""
+import asyncio
+from types import SimpleNamespace
+
+from custom_components.new_light.outbound import SCHEDULED, SWITCH, TRACKER, OutboundScheduler
+
+
+def _scheduler(sent):
+    loop = asyncio.get_running_loop()
+    hass = SimpleNamespace(loop=loop, data={}, async_create_task=loop.create_task)
+
+    async def send(domain, service, service_data=None, **kwargs):
+        sent.append((service, service_data))
+
+    # One command of burst, then one every 10 ms
+    return OutboundScheduler(hass, send=send, rate=100, burst=1)
+
+
+def test_switch_overtakes_queued_background_commands():
+    async def run():
+        sent = []
+        outbound = _scheduler(sent)
+
+        await asyncio.gather(
+            outbound.async_call(SCHEDULED, "light", "turn_on", {"entity_id": "light.a"}),
+            outbound.async_call(SCHEDULED, "light", "turn_on", {"entity_id": "light.b"}),
+            outbound.async_call(TRACKER, "light", "turn_on", {"entity_id": "light.c"}),
+            outbound.async_call(SWITCH, "light", "turn_on", {"entity_id": "light.d"}),
+        )
+
+        assert [data["entity_id"] for _, data in sent] == ["light.a", "light.d", "light.c", "light.b"]
+        assert outbound.wait_stats["switch"]["count"] == 1
+        assert outbound.queued == 0
+
+    asyncio.run(run())
+
+
+def test_newer_background_command_replaces_queued_one():
+    async def run():
+        sent = []
+        outbound = _scheduler(sent)
+
+        await asyncio.gather(
+            outbound.async_call(SCHEDULED, "light", "turn_on", {"entity_id": "light.a"}),
+            outbound.async_call(SCHEDULED, "light", "turn_on", {"entity_id": "light.b", "brightness": 10}),
+            outbound.async_call(SCHEDULED, "light", "turn_on", {"entity_id": "light.b", "brightness": 20}),
+        )
+
+        assert sent[1:] == [("turn_on", {"entity_id": "light.b", "brightness": 20})]
+        assert outbound.coalesced == 1
+
+    asyncio.run(run())
+
+
+def test_urgent_command_drops_queued_ones_for_same_light():
+    async def run():
+        sent = []
+        outbound = _scheduler(sent)
+
+        await asyncio.gather(
+            outbound.async_call(SCHEDULED, "light", "turn_on", {"entity_id": "light.a"}),
+            outbound.async_call(SCHEDULED, "light", "turn_on", {"entity_id": "light.b"}),
+            outbound.async_call(SWITCH, "light", "turn_off", {"entity_id": "light.b"}),
+        )
+
+        assert sent[1:] == [("turn_off", {"entity_id": "light.b"})]
+        assert outbound.superseded == 1
+
+    asyncio.run(run())
@@ -0,0 +1,94 @@
+"""Tests for the zigbee2mqtt topic router"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.new_light.router import MqttTopicRouter
+
+
+class FakeBroker:
+    """Stands in for hass.components.mqtt.async_subscribe"""
+
+    def __init__(self) -> None:
+        self.subscriptions = []
+        self.unsubscribed = 0
+
+    async def async_subscribe(self, topic, msg_callback):
+        self.subscriptions.append((topic, msg_callback))
+
+        def unsubscribe() -> None:
+            self.unsubscribed += 1
+
+        return unsubscribe
+
+    def publish(self, topic, payload) -> None:
+        for pattern, msg_callback in self.subscriptions:
+            msg_callback(SimpleNamespace(topic=topic, payload=payload))
+
+
+def _hass(loop):
+    return SimpleNamespace(loop=loop, async_create_task=loop.create_task)
+
+
+def test_dispatches_on_exact_topic():
+    async def run():
+        broker = FakeBroker()
+        router = MqttTopicRouter(_hass(asyncio.get_running_loop()), subscribe=broker.async_subscribe)
+        kitchen, hall = [], []
+
+        async def on_kitchen(msg):
+            kitchen.append(msg.payload)
+
+        async def on_hall(msg):
+            hall.append(msg.payload)
+
+        await router.async_register("zigbee2mqtt/Kitchen Switch/action", on_kitchen)
+        await router.async_register("zigbee2mqtt/Hall Switch/action", on_hall)
+        broker.publish("zigbee2mqtt/Kitchen Switch/action", "on-press")
+        broker.publish("zigbee2mqtt/Kitchen Motion Sensor", '{"occupancy": true}')
+        await asyncio.sleep(0)
+
+        assert broker.subscriptions[0][0] == "zigbee2mqtt/#"
+        assert len(broker.subscriptions) == 1
+        assert kitchen == ["on-press"]
+        assert hall == []
+        assert router.routed == 1
+        assert router.unmatched == 1
+
+    asyncio.run(run())
+
+
+def test_unregister_drops_subscription_with_last_route():
+    async def run():
+        broker = FakeBroker()
+        router = MqttTopicRouter(_hass(asyncio.get_running_loop()), subscribe=broker.async_subscribe)
+        received = []
+
+        async def handler(msg):
+            received.append(msg.payload)
+
+        unregister = await router.async_register("zigbee2mqtt/Kitchen Switch/action", handler)
+        unregister()
+        broker.publish("zigbee2mqtt/Kitchen Switch/action", "on-press")
+        await asyncio.sleep(0)
+
+        assert received == []
+        assert broker.unsubscribed == 1
+
+    asyncio.run(run())
+
+
+def test_rejects_topic_outside_base():
+    async def run():
+        broker = FakeBroker()
+        router = MqttTopicRouter(_hass(asyncio.get_running_loop()), subscribe=broker.async_subscribe)
+
+        async def handler(msg):
+            pass
+
+        with pytest.raises(ValueError):
+            await router.async_register("tasmota/Kitchen", handler)
+        assert broker.subscriptions == []
+
+    asyncio.run(run())
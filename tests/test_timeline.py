@@ -0,0 +1,37 @@
+"""Tests for the RightLight trip point timelines"""
+from datetime import datetime, timedelta, timezone
+
+from custom_components.new_light.timeline import Timeline, TimelineStore
+
+
+def _timeline(times):
+    return Timeline(times, [(255, 0, 0)], [0] * len(times))
+
+
+def test_find_at_trip_point_starts_its_span():
+    timeline = _timeline([0.0, 10.0, 20.0])
+
+    assert timeline.find(5.0) == (0, 1)
+    assert timeline.find(10.0) == (1, 2)
+
+
+def test_find_clamps_to_last_span():
+    timeline = _timeline([0.0, 10.0, 20.0])
+
+    assert timeline.find(20.0) == (1, 2)
+    assert timeline.find(25.0) == (1, 2)
+
+
+def test_day_ends_on_next_midnight():
+    now = datetime(2024, 6, 21, 23, 59, 30, tzinfo=timezone.utc)
+    midnight = now.replace(hour=0, minute=0, second=0)
+    next_midnight = (midnight + timedelta(days=1)).timestamp()
+
+    timelines = TimelineStore().get(now, 52.37, 4.89)
+
+    for mode, timeline in timelines.items():
+        assert timeline.times[0] == midnight.timestamp(), mode
+        assert timeline.times[-1] == next_midnight, mode
+        prev, next = timeline.find(now.timestamp())
+        assert timeline.times[prev] <= now.timestamp() < timeline.times[next], mode
+        assert timeline.find(midnight.timestamp()) == (0, 1), mode